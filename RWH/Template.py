@@ -1,156 +1,202 @@
 # template.py
 import re
+import os
+import copy
+import struct
+import zlib
+import zipfile
 import logging
+import threading
 from datetime import datetime
 from docx import Document
+from docx.opc.oxml import serialize_part_xml
+from docx.oxml.ns import qn
 from docx.shared import Pt
+from docx.text.paragraph import Paragraph
 from utils import process_element
-
-def fill_template(template_path, output_path, data, camera_found, form_data, keyname_fallback):
-    doc = Document(template_path)
-
-    current_date = datetime.now().strftime("%m/%d/%Y")
-    filename_date = current_date.replace("/", "")
-
-    logging.debug(f"Available sections in data: {list(data.keys())}")
-
-    brand_section = next((key for key in data if 'Computer Brand Name' in data[key]), None)
-    serial_section = next((key for key in data if 'Product Serial Number' in data[key]), None) or next((key for key in data if key == "System"), None)
-
-    logging.debug(f"Brand section: {brand_section}")
-    if brand_section:
-        logging.debug(f"Brand section data: {data[brand_section]}")
-    logging.debug(f"Serial section: {serial_section}")
-    if serial_section:
-        logging.debug(f"Serial section data: {data[serial_section]}")
-
-    video_chipsets = keyname_fallback.get("Video Chipset", "N/A")
-    # Fix: Clean video chipset strings by removing "Video Chipset:" prefix and normalizing spaces
-    cleaned_chipsets = re.sub(r'^Video Chipset:\s*', '', video_chipsets) #:\s*', '', chipset).strip() for chipset in video_chipsets]
-    video_chipset_str = "".join(cleaned_chipsets) if cleaned_chipsets else "N/A"
-    logging.debug(f"Video chipset string: {video_chipset_str}")
-
-    screen_size = ""
-    resolution = ""
-    monitor_section = next((key for key in data if 'Supported Video Modes' in data[key]), None)
-    if not monitor_section:
-        monitor_section = next((key for key in data if 'Monitor Name (Manuf)' in data[key]), None)
-    logging.debug(f"Monitor section: {monitor_section}")
-    if monitor_section:
-        monitor_data = data[monitor_section]
-        logging.debug(f"Monitor section data: {monitor_data}")
-        if 'Monitor Name (Manuf)' in monitor_data:
-            monitor_name = monitor_data['Monitor Name (Manuf)'].lower()
-            if '17' in monitor_name:
-                screen_size = "17\""
-            elif '156' in monitor_name:
-                screen_size = "15.6\""
-            elif '154' in monitor_name:
-                screen_size = "15.4\""
-            elif '14' in monitor_name:
-                screen_size = "14\""
-            elif '13' in monitor_name:
-                screen_size = "13\""
-            elif '12' in monitor_name:
-                screen_size = "12\""
+from instrumentation import count, stage
+
+PLACEHOLDER_PATTERN = re.compile(r'\[\d+\]')
+
+DEFLATE_LEVEL_ENV = "RWH_DOCX_DEFLATE_LEVEL"
+DEFAULT_DEFLATE_LEVEL = 6
+
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+ZIP_UTF8_FLAG = 0x800
+ZIP_LIMIT = 0xFFFFFFFF
+
+_compiled_templates = {}
+_compiled_templates_lock = threading.Lock()
+
+
+def deflate_level():
+    try:
+        level = int(os.environ.get(DEFLATE_LEVEL_ENV, DEFAULT_DEFLATE_LEVEL))
+    except ValueError:
+        logging.warning("Ignoring invalid %s=%r", DEFLATE_LEVEL_ENV, os.environ[DEFLATE_LEVEL_ENV])
+        level = DEFAULT_DEFLATE_LEVEL
+    return min(max(level, 0), 9)
+
+def dos_timestamp(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+class PackageWriter:
+    # Writes a .docx member by member: the rewritten parts are deflated
+    # fresh and every other member's compressed bytes are copied verbatim
+    # from the template, so images, styles and settings are never inflated
+    # or recompressed.
+    def __init__(self, template_path, rewritten):
+        self.members = []
+        with open(template_path, 'rb') as f, zipfile.ZipFile(f) as package:
+            infos = package.infolist()
+            if len(infos) >= 0xFFFF or os.fstat(f.fileno()).st_size >= ZIP_LIMIT:
+                raise ValueError("package needs ZIP64")
+            for info in infos:
+                if info.flag_bits & 0x1:
+                    raise ValueError(f"{info.filename} is encrypted")
+                if info.filename in rewritten:
+                    self.members.append((info, None))
+                    continue
+                if info.compress_type not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                    raise ValueError(f"{info.filename} uses compression method {info.compress_type}")
+                f.seek(info.header_offset)
+                header = LOCAL_HEADER.unpack(f.read(LOCAL_HEADER.size))
+                f.seek(info.header_offset + LOCAL_HEADER.size + header[9] + header[10])
+                self.members.append((info, f.read(info.compress_size)))
+        missing = set(rewritten) - {info.filename for info, _ in self.members}
+        if missing:
+            raise ValueError(f"package has no {', '.join(sorted(missing))}")
+
+    def write(self, output_path, parts, level):
+        chunks = []
+        central = []
+        offset = 0
+        for info, data in self.members:
+            if data is None:
+                content = parts[info.filename]
+                compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+                data = compressor.compress(content) + compressor.flush()
+                crc, size, method = zlib.crc32(content), len(content), zipfile.ZIP_DEFLATED
             else:
-                screen_size = "Unknown"
-            logging.debug(f"Screen size determined: {screen_size}")
-        if 'Supported Video Modes' in monitor_data:
-            resolution = monitor_data['Supported Video Modes'].strip()
-            logging.debug(f"Resolution: {resolution}")
-
-    camera_present = 'Y' if camera_found else 'N'
-    logging.debug(f"Camera present: {camera_present}")
-
-    battery_info = "No"
-    battery_section = next((key for key in data if 'Wear Level' in data[key]), None)
-    if battery_section and 'Wear Level' in data[battery_section]:
-        wear_level = float(data[battery_section]['Wear Level'].replace('%', ''))
-        remaining_health = 100 - wear_level
-        battery_info = f"Yes, {remaining_health:.1f}% remaining health"
-        logging.debug(f"Battery info: {battery_info}")
-
-    memory_info = ""
-    memory_size = data.get("Memory", {}).get('Total Memory Size', '')
-    memory_speed = data.get("Memory", {}).get('Memory Speed', '')
-
-    logging.debug(f"Memory size: {memory_size}, Memory speed: {memory_speed}")
-    if memory_size and memory_speed:
-        ddr_match = re.search(r'DDR\d+-\d+', memory_speed)
-        if ddr_match:
-            speed_part = ddr_match.group(0)
-            memory_info = f"{memory_size} {speed_part}MHz"
-        else:
-            memory_info = f"{memory_size}MHz"
-        logging.debug(f"Memory info after parsing: {memory_info}")
-    elif memory_size:
-        memory_info = f"{memory_size}MHz"
-    logging.debug(f"Final memory info: {memory_info}")
-
-    network_info = "N/A"
-    network_card = next((data[section].get('Network Card', '') for section in data if 'Network Card' in data[section]), '')
-    link_speed = keyname_fallback.get("Maximum Link Speed", [])
-    if network_card:
-        network_info = f"{network_card} - {link_speed[0] if link_speed else '866 Mbps'}"
-    logging.debug(f"Final network info: {network_info}")
-
-    drive_model = "N/A"
-    drive_section = next((key for key in data if 'Drive Model' in data[key]), None)
-    if drive_section:
-        drive_model = data[drive_section].get('Drive Model', 'N/A')
-        logging.debug(f"Drive model: {drive_model}")
-
-    dvd_cd = "None"
-
-    audio_section = next((key for key in data if 'Audio Adapter' in data[key]), None)
-    audio_adapter = data.get(audio_section, {}).get('Audio Adapter', 'N/A') if audio_section else 'N/A'
-    logging.debug(f"Audio section: {audio_section}, Audio adapter: {audio_adapter}")
-
-    os_value = keyname_fallback.get("Operating System", "N/A")
-    os_cleaned = re.sub(r'^Operating System:\s*', '', os_value)
-    logging.debug(f"Final operating system value: {os_cleaned}")
-
-    power_adaptor = 'Yes' if form_data['power_adaptor'] else 'No'
-    logging.debug(f"Power adaptor: {power_adaptor}")
-
+                crc, size, method = info.CRC, info.file_size, info.compress_type
+            if offset >= ZIP_LIMIT or size >= ZIP_LIMIT:
+                raise ValueError("package needs ZIP64")
+            name = info.filename.encode('utf-8')
+            flags = 0 if name.isascii() else ZIP_UTF8_FLAG
+            dostime, dosdate = dos_timestamp(info.date_time)
+            local = LOCAL_HEADER.pack(b"PK\x03\x04", 20, flags, method, dostime, dosdate, crc, len(data), size, len(name), 0)
+            central.append(CENTRAL_HEADER.pack(b"PK\x01\x02", (info.create_system << 8) | 20, 20, flags, method, dostime, dosdate,
+                                               crc, len(data), size, len(name), 0, 0, 0, 0, info.external_attr, offset) + name)
+            chunks.extend((local, name, data))
+            offset += len(local) + len(name) + len(data)
+        directory = b"".join(central)
+        chunks.append(directory)
+        chunks.append(END_RECORD.pack(b"PK\x05\x06", 0, 0, len(central), len(central), len(directory), offset, 0))
+        with open(output_path, 'wb') as f:
+            f.write(b"".join(chunks))
+
+
+class CompiledTemplate:
+    # Parses the template once and remembers which body paragraphs carry
+    # placeholders, so each render only deep-copies the document XML,
+    # substitutes those paragraphs and writes only that part back out.
+    def __init__(self, template_path):
+        self.template_path = template_path
+        self._document = Document(template_path)
+        self._pristine = copy.deepcopy(self._document.part.element)
+        self._lock = threading.Lock()
+        self.placeholder_paragraphs = self._locate_placeholders()
+        self._part_name = self._document.part.partname.lstrip('/')
+        try:
+            self._package = PackageWriter(template_path, {self._part_name})
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            logging.warning("Falling back to python-docx save for %s: %s", template_path, e)
+            self._package = None
+        logging.debug("Compiled template %s: %s placeholder paragraph(s)", template_path, len(self.placeholder_paragraphs))
+
+    def _locate_placeholders(self):
+        paragraphs = list(self._document.paragraphs)
+        for table in self._document.tables:
+            for row in table.rows:
+                for cell in row.cells:
+                    paragraphs.extend(cell.paragraphs)
+
+        positions = {p: index for index, p in enumerate(self._document.part.element.iter(qn('w:p')))}
+        located = {}
+        for paragraph in paragraphs:
+            placeholders = PLACEHOLDER_PATTERN.findall(paragraph.text)
+            if placeholders:
+                located[positions[paragraph._p]] = tuple(dict.fromkeys(placeholders))
+        return sorted(located.items())
+
+    def substitute(self, replacements):
+        # Returns a fresh copy of the document XML with the placeholders
+        # replaced; the template itself is left untouched.
+        with stage("render.substitute"):
+            element = copy.deepcopy(self._pristine)
+            paragraphs = list(element.iter(qn('w:p')))
+            for index, placeholders in self.placeholder_paragraphs:
+                paragraph_replacements = {placeholder: replacements[placeholder] for placeholder in placeholders if placeholder in replacements}
+                if paragraph_replacements:
+                    process_element(Paragraph(paragraphs[index], None), paragraph_replacements)
+        return element
+
+    def render(self, output_path, replacements):
+        with self._lock:
+            element = self.substitute(replacements)
+            with stage("render.save", output=output_path):
+                if self._package is not None:
+                    self._package.write(output_path, {self._part_name: serialize_part_xml(element)}, deflate_level())
+                else:
+                    self._document.part._element = element
+                    self._document.save(output_path)
+            count("bytes_written", os.path.getsize(output_path))
+
+
+def get_compiled_template(template_path):
+    template_path = os.path.abspath(template_path)
+    stat = os.stat(template_path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _compiled_templates_lock:
+        cached = _compiled_templates.get(template_path)
+        if cached is None or cached[0] != key:
+            with stage("template.compile", template=template_path):
+                cached = (key, CompiledTemplate(template_path))
+            _compiled_templates[template_path] = cached
+    return cached[1]
+
+def fill_template(template_path, output_path, profile, form_data):
+    template = get_compiled_template(template_path)
+    current_date = datetime.now().strftime("%m/%d/%Y")
     screen_label = "Touchscreen" if form_data['touchscreen'] else "Screen"
 
-    brand_name = data.get(brand_section, {}).get('Computer Brand Name', 'N/A') if brand_section else 'N/A'
-    serial_number = data.get(serial_section, {}).get('Product Serial Number', 'N/A') if serial_section else 'N/A'
-
     replacements = {
         '[1]': current_date,
         '[2]': form_data['technician_initials'],
-        '[3]': brand_name,
-        '[4]': serial_number,
-        '[5]': data.get(serial_section, {}).get('SKU Number', 'N/A') if serial_section else 'N/A',
+        '[3]': profile.brand_name or 'N/A',
+        '[4]': profile.serial_number or 'N/A',
+        '[5]': profile.sku_number or 'N/A',
         '[6]': f"{'Yes' if form_data['warranty'] else 'No'}, {form_data['warranty_date'] if form_data['warranty'] else 'N/A'}",
-        '[7]': data.get('Processor', {}).get('CPU Brand Name', 'N/A'),
-        '[8]': memory_info if memory_info else 'N/A',
-        '[9]': drive_model if drive_model != "N/A" else 'N/A',
-        '[10]': dvd_cd,
-        '[11]': network_info if network_info != "N/A" else 'N/A',
-        '[12]': f"{screen_size} {screen_label}, {resolution} res, {video_chipset_str}",
-        '[13]': audio_adapter,
-        '[14]': os_cleaned if os_cleaned != "N/A" else "N/A",
-        '[15]': battery_info,
-        '[16]': power_adaptor,
-        '[17]': camera_present,
+        '[7]': profile.cpu,
+        '[8]': profile.memory,
+        '[9]': profile.drive_model,
+        '[10]': "None",
+        '[11]': profile.network,
+        '[12]': f"{profile.screen_size} {screen_label}, {profile.resolution} res, {profile.video_chipsets}",
+        '[13]': profile.audio_adapter,
+        '[14]': profile.operating_system,
+        '[15]': profile.battery,
+        '[16]': 'Yes' if form_data['power_adaptor'] else 'No',
+        '[17]': 'Y' if profile.camera_found else 'N',
         '[18]': form_data['ports'],
         '[19]': form_data['condition']
     }
 
-    logging.debug(f"Replacements: {replacements}")
-
-    for paragraph in doc.paragraphs:
-        process_element(paragraph, replacements)
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    process_element(paragraph, replacements)
+    logging.debug("Replacements: %s", replacements)
 
-    doc.save(output_path)
-    logging.info(f"Document saved to {output_path}")
\ No newline at end of file
+    template.render(output_path, replacements)
+    logging.info("Document saved to %s", output_path)
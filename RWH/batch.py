@@ -0,0 +1,318 @@
+# batch.py
+import argparse
+import csv
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from parser import build_hardware_profile, parse_txt_file
+from template import fill_template
+from utils import build_output_filename
+from cache import get_parse_cache
+from instrumentation import LOG_LEVEL_ENV, configure_logging, enable_memory_profiling, memory_profiling_enabled, metrics_run, stage, stage_timing_enabled
+
+LOG_EXTENSIONS = ('.txt', '.log')
+FORM_FIELDS = ['technician_initials', 'warranty', 'warranty_date', 'power_adaptor', 'touchscreen', 'ports', 'condition']
+BOOLEAN_FIELDS = ['warranty', 'power_adaptor', 'touchscreen']
+REQUIRED_FIELDS = ['technician_initials', 'ports', 'condition']
+DEFAULT_ROW = '*'
+
+
+def collect_logs(source):
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source)
+    return sorted(path for path in paths if os.path.isfile(path) and path.lower().endswith(LOG_EXTENSIONS))
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'y', 'yes', 'true', 'x')
+
+
+def load_form_data(path):
+    # Rows are keyed by the log file name (with or without extension); a row
+    # whose log is "*" supplies defaults for every unit.
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+        rows = [dict(row, log=log) for log, row in content.items()] if isinstance(content, dict) else content
+    else:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    form_rows = {}
+    for row in rows:
+        log = (row.get('log') or '').strip()
+        if not log:
+            logging.warning("Skipping form data row without a log name: %s", row)
+            continue
+        form_rows[log.lower()] = {field: row[field] for field in FORM_FIELDS if row.get(field) not in (None, '')}
+    return form_rows
+
+
+def form_data_for(log_path, form_rows):
+    name = os.path.basename(log_path).lower()
+    row = dict(form_rows.get(DEFAULT_ROW, {}))
+    row.update(form_rows.get(name) or form_rows.get(os.path.splitext(name)[0]) or {})
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        raise ValueError(f"No form data for {os.path.basename(log_path)} (missing {', '.join(missing)})")
+
+    form_data = {field: str(row.get(field, '')) for field in FORM_FIELDS}
+    for field in BOOLEAN_FIELDS:
+        form_data[field] = parse_bool(row.get(field, False))
+    if form_data['warranty'] and not form_data['warranty_date']:
+        raise ValueError(f"Warranty set for {os.path.basename(log_path)} without a warranty date")
+    return form_data
+
+
+def unit_memory(run):
+    return dict(run.memory, stages={name: {key: entry[key] for key in ('peak_bytes', 'traced_peak_bytes', 'retained_bytes')}
+                                    for name, entry in run.stages.items()})
+
+
+def combine_memory(parse_memory, render_memory):
+    # Top sites come from whichever phase peaked higher.
+    heavier = max(parse_memory, render_memory, key=lambda memory: memory['traced_peak_bytes'])
+    return dict(heavier,
+                peak_bytes=max(parse_memory['peak_bytes'], render_memory['peak_bytes']),
+                retained_bytes=max(parse_memory['retained_bytes'], render_memory['retained_bytes']),
+                stages=dict(parse_memory['stages'], **render_memory['stages']))
+
+
+def parse_unit(log_path, use_cache=True):
+    start = time.perf_counter()
+    cache = get_parse_cache() if use_cache else None
+    hits_before = cache.hits if cache else 0
+    with metrics_run("unit", write=False, log=os.path.basename(log_path), phase="parse") as run:
+        with stage("parse"):
+            if cache:
+                data, camera_found, keyname_fallback = cache.parse(log_path, parse_txt_file)
+            else:
+                data, camera_found, keyname_fallback = parse_txt_file(log_path)
+            if not data.get('System'):
+                raise ValueError("no System data found; is this an HWINFO report?")
+            profile = build_hardware_profile(data, camera_found, keyname_fallback)
+    result = {
+        'log': log_path,
+        'profile': profile,
+        'parse_seconds': time.perf_counter() - start,
+        'cached': bool(cache) and cache.hits > hits_before,
+    }
+    if run.memory:
+        result['memory'] = unit_memory(run)
+    return result
+
+
+def render_unit(unit, template_path):
+    start = time.perf_counter()
+    with metrics_run("unit", write=False, log=os.path.basename(unit['log']), phase="render") as run:
+        with stage("render"):
+            fill_template(template_path, unit['output'], unit['profile'], unit['form_data'])
+    render_seconds = time.perf_counter() - start
+    result = {
+        'log': unit['log'],
+        'output': unit['output'],
+        'parse_seconds': unit['parse_seconds'],
+        'render_seconds': render_seconds,
+        'total_seconds': unit['parse_seconds'] + render_seconds,
+        'cached': unit['cached'],
+    }
+    if run.memory:
+        result['memory'] = combine_memory(unit['memory'], unit_memory(run)) if 'memory' in unit else unit_memory(run)
+    return result
+
+
+def run_step(func, log_path, *args):
+    # Runs in the parent for sequential batches and in a worker process for
+    # parallel ones; any failure is returned rather than raised so one bad log
+    # cannot take down the rest of the batch.
+    try:
+        return func(*args)
+    except Exception as e:
+        logging.error("Failed to process %s: %s", log_path, e, exc_info=logging.getLogger().isEnabledFor(logging.DEBUG))
+        return {'log': log_path, 'error': str(e)}
+
+
+def map_units(executor, func, calls):
+    # Yields results in call order so the output lines up with the input
+    # listing, whether or not a worker pool is in use.
+    if executor is None:
+        for log_path, args in calls:
+            yield run_step(func, log_path, *args)
+        return
+    futures = [executor.submit(run_step, func, log_path, *args) for log_path, args in calls]
+    for (log_path, _), future in zip(calls, futures):
+        try:
+            yield future.result()
+        except Exception as e:
+            logging.error("Worker failed while processing %s: %s", log_path, e)
+            yield {'log': log_path, 'error': f"worker failed: {str(e)}"}
+
+
+def assign_output_paths(units, output_dir):
+    # Two logs for the same unit would otherwise write the same worksheet
+    # (at the same time under -j), so every clashing name gets its log's
+    # stem appended.
+    claims = {}
+    for unit in units:
+        path = build_output_filename(output_dir or os.path.dirname(unit['log']), unit['profile'])
+        claims.setdefault(os.path.normcase(os.path.abspath(path)), []).append((unit, path))
+    used = {key for key, entries in claims.items() if len(entries) == 1}
+    for entries in claims.values():
+        for unit, path in entries:
+            if len(entries) > 1:
+                root, ext = os.path.splitext(path)
+                stem = os.path.splitext(os.path.basename(unit['log']))[0]
+                path = candidate = f"{root}_{stem}{ext}"
+                suffix = 2
+                while os.path.normcase(os.path.abspath(path)) in used:
+                    path = f"{os.path.splitext(candidate)[0]}_{suffix}{ext}"
+                    suffix += 1
+                logging.warning("%s shares its worksheet name with another log; writing %s", unit['log'], path)
+                used.add(os.path.normcase(os.path.abspath(path)))
+            unit['output'] = path
+
+
+def report_result(index, total, result):
+    name = os.path.basename(result['log'])
+    if 'error' in result:
+        print(f"[{index}/{total}] {name}: FAILED ({result['error']})")
+    else:
+        cached = " (cached)" if result['cached'] else ""
+        memory = f", peak {result['memory']['peak_bytes'] / 1048576:.1f} MB" if 'memory' in result else ""
+        print(f"[{index}/{total}] {name}: parse {result['parse_seconds']:.3f}s{cached}, "
+              f"render {result['render_seconds']:.3f}s, total {result['total_seconds']:.3f}s{memory} -> {result['output']}")
+
+
+def init_worker(log_level, stage_timing, memory_profile=False):
+    configure_logging(log_level, stage_timing, fmt='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+    if memory_profile:
+        enable_memory_profiling()
+
+
+def resolve_form_data(log_paths, form_rows):
+    # Done in the parent so each worker task carries only its own unit's form
+    # data; a log without usable form data gets its error instead.
+    resolved = {}
+    for log_path in log_paths:
+        try:
+            resolved[log_path] = form_data_for(log_path, form_rows)
+        except ValueError as e:
+            logging.error("Failed to process %s: %s", log_path, e)
+            resolved[log_path] = {'log': log_path, 'error': str(e)}
+    return resolved
+
+
+def run_batch(log_paths, template_path, output_dir, form_rows, jobs=1, use_cache=True):
+    # Logs are parsed first so every output name is known (and made unique)
+    # before any worksheet is written.
+    batch_start = time.perf_counter()
+    form_data = resolve_form_data(log_paths, form_rows)
+    results = {log_path: entry for log_path, entry in form_data.items() if 'error' in entry}
+
+    executor = None
+    if jobs > 1:
+        logging.info("Generating %s worksheets with %s worker processes", len(log_paths), jobs)
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(logging.getLogger().level, stage_timing_enabled(), memory_profiling_enabled()))
+    try:
+        units = []
+        for unit in map_units(executor, parse_unit, [(log_path, (log_path, use_cache)) for log_path in log_paths if log_path not in results]):
+            if 'error' in unit:
+                results[unit['log']] = unit
+            else:
+                units.append(dict(unit, form_data=form_data[unit['log']]))
+        assign_output_paths(units, output_dir)
+        rendered = map_units(executor, render_unit, [(unit['log'], (unit, template_path)) for unit in units])
+        for index, log_path in enumerate(log_paths, 1):
+            if log_path not in results:
+                result = next(rendered)
+                results[result['log']] = result
+            report_result(index, len(log_paths), results[log_path])
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    results = [results[log_path] for log_path in log_paths]
+    print_summary(results, time.perf_counter() - batch_start, jobs)
+    return results
+
+
+def print_summary(results, elapsed, jobs=1):
+    succeeded = [result for result in results if 'error' not in result]
+    failed = len(results) - len(succeeded)
+    print(f"\nProcessed {len(results)} log(s) in {elapsed:.2f}s with {jobs} worker(s): {len(succeeded)} succeeded, {failed} failed")
+    if succeeded:
+        average = sum(result['total_seconds'] for result in succeeded) / len(succeeded)
+        per_minute = len(succeeded) / elapsed * 60 if elapsed > 0 else float('inf')
+        print(f"Average {average:.3f}s per unit, throughput {per_minute:.1f} units/minute")
+        cached = sum(1 for result in succeeded if result['cached'])
+        if cached:
+            print(f"Parse cache hits: {cached}/{len(succeeded)}")
+        print_memory_summary([result for result in succeeded if 'memory' in result])
+
+
+def print_memory_summary(results):
+    # The largest footprint any single unit needed, per stage and overall, to
+    # size process-pool workers. Traced peak also counts what the process
+    # already held from earlier units (e.g. the compiled template).
+    if not results:
+        return
+    worst = max(results, key=lambda result: result['memory']['traced_peak_bytes'])
+    print(f"\nMemory (tracemalloc, Python allocations only), max across {len(results)} unit(s):")
+    print(f"  traced peak {worst['memory']['traced_peak_bytes'] / 1048576:.1f} MB "
+          f"({os.path.basename(worst['log'])}), unit peak {max(result['memory']['peak_bytes'] for result in results) / 1048576:.1f} MB, "
+          f"retained {max(result['memory']['retained_bytes'] for result in results) / 1048576:.1f} MB")
+    stage_names = dict.fromkeys(name for result in results for name in result['memory']['stages'])
+    for name in stage_names:
+        entries = [result['memory']['stages'][name] for result in results if name in result['memory']['stages']]
+        print(f"  {name:<24} peak {max(entry['peak_bytes'] for entry in entries) / 1048576:8.1f} MB, "
+              f"retained {max(entry['retained_bytes'] for entry in entries) / 1048576:8.1f} MB")
+    print("  Top allocation sites for that unit:")
+    for site in worst['memory']['top_sites']:
+        print(f"    {site['size_bytes'] / 1024:10.1f} KB {site['count']:8d} blocks  {site['site']}")
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Generate refurb worksheets for a folder of HWINFO logs without the GUI.")
+    arg_parser.add_argument('logs', help="Directory or glob pattern of HWINFO .txt/.log files")
+    arg_parser.add_argument('form_data', help="CSV or JSON file with per-unit form data, keyed by log file name")
+    arg_parser.add_argument('-t', '--template', default=os.path.join(os.getcwd(), "Template.docx"), help="Worksheet template (default: ./Template.docx)")
+    arg_parser.add_argument('-o', '--output', help="Output directory (default: next to each log)")
+    arg_parser.add_argument('-j', '--jobs', type=int, default=0, help="Worker processes for parallel generation; 1 runs in this process (default: one per CPU core)")
+    arg_parser.add_argument('--no-cache', action='store_true', help="Always re-parse logs instead of using the parse cache")
+    arg_parser.add_argument('-v', '--verbose', action='store_true', help="Enable debug logging (same as --log-level DEBUG)")
+    arg_parser.add_argument('--log-level', help="Logging level (default: RWH_LOG_LEVEL or WARNING)")
+    arg_parser.add_argument('--stage-timing', action='store_true', help="Log one timing line per parse/render stage (or set RWH_STAGE_TIMING=1)")
+    arg_parser.add_argument('--memory-profile', action='store_true', help="Report per-stage peak/retained memory with tracemalloc (or set RWH_MEMORY_PROFILE=1); combine with --no-cache to profile parsing")
+    args = arg_parser.parse_args(argv)
+
+    configure_logging("DEBUG" if args.verbose else args.log_level or os.environ.get(LOG_LEVEL_ENV, "WARNING"),
+                      stage_timing=True if args.stage_timing else None)
+    if args.memory_profile:
+        enable_memory_profiling()
+
+    log_paths = collect_logs(args.logs)
+    if not log_paths:
+        print(f"No .txt or .log files found in {args.logs}")
+        return 1
+    if not os.path.exists(args.template):
+        print(f"Template file {args.template} not found")
+        return 1
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count() or 1
+    jobs = min(jobs, len(log_paths))
+    results = run_batch(log_paths, args.template, args.output, load_form_data(args.form_data), jobs, not args.no_cache)
+    return 0 if all('error' not in result for result in results) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
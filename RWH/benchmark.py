@@ -0,0 +1,317 @@
+# benchmark.py
+# Times parse_txt_file, process_element, fill_template and the whole
+# Generate path against synthetic HWINFO reports and the bundled
+# Template.docx, writes the results to JSON, and can compare them with a
+# stored baseline to catch regressions (e.g. from a module update).
+#   python benchmark.py -o results.json
+#   python benchmark.py --compare baseline.json --threshold 0.15
+#   python benchmark.py --modules module_cache --compare baseline.json
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from parser import ASSETS_DIR_ENV, PARSER_VERSION, build_hardware_profile, parse_txt_file
+from template import fill_template, get_compiled_template
+from utils import build_output_filename
+from instrumentation import configure_logging
+from sha256 import calculate_sha256
+
+METRICS = ["parse", "substitute", "render", "end_to_end"]
+ENCODINGS = ["utf-16le", "utf-8"]
+KINDS = ["summary", "full"]
+# Differences smaller than this are treated as noise by --compare.
+NOISE_FLOOR_MS = 1.0
+# Names this script takes from each updatable module, in the order the
+# updater loads them (utils.py first, so template.py binds the new utils).
+MODULE_NAMES = {
+    "utils.py": ["build_output_filename"],
+    "parser.py": ["PARSER_VERSION", "parse_txt_file", "build_hardware_profile"],
+    "template.py": ["fill_template", "get_compiled_template"],
+}
+
+BRANDS = [("Dell Latitude 5400", "LG Display LP140WF7"), ("HP EliteBook 840 G6", "AU Optronics B140HAN"),
+          ("Lenovo ThinkPad T490", "BOE NV140FHM-N49"), ("Dell Latitude 7490", "Sharp LQ156M1JW"),
+          ("HP ProBook 450 G7", "Chi Mei N156HGA-EAB"), ("Lenovo ThinkPad X13", "Innolux N133HCE")]
+CPUS = ["Intel Core i5-8365U", "Intel Core i7-8665U", "Intel Core i5-10310U", "AMD Ryzen 5 PRO 4650U"]
+DRIVES = ["SAMSUNG MZVLB256HAHQ 256 GB", "SK hynix PC401 512 GB", "Toshiba KBG40ZNS256G 256 GB", "WDC PC SN730 1024 GB"]
+DEVICE_CLASSES = ["System", "USB", "HIDClass", "Net", "Display", "MEDIA", "DiskDrive", "Battery", "Bluetooth", "SoftwareDevice"]
+SENSORS = ["Core VIDs", "Core Clocks", "CPU Package", "GPU Temperature", "Drive Temperature", "Charge Rate", "Fan Speed"]
+
+
+def summary_lines(rng, unit):
+    brand, monitor = rng.choice(BRANDS)
+    ram = rng.choice([8, 16, 32])
+    lines = [
+        "HWiNFO64 Report",
+        "[General Information]",
+        f"Computer Brand Name:\t\t{brand}",
+        f"Product Serial Number:\t\tSN{unit:05d}{rng.randrange(16 ** 4):04X}",
+        f"SKU Number:\t\t{rng.randrange(16 ** 4):04X}",
+        "Operating System:\t\tMicrosoft Windows 11 Professional (x64) Build 22631",
+        f"CPU Brand Name:\t\t{rng.choice(CPUS)}",
+        f"Total Memory Size:\t\t{ram} GBytes",
+        "Memory Speed:\t\t1333.3 MHz (DDR4-2666 / PC4-21300)",
+        f"Drive Model:\t\t{rng.choice(DRIVES)}",
+        "Drive Model:\t\tGeneric 16 GB",
+        f"Monitor Name (Manuf):\t\t{monitor}",
+        "[Supported Video Modes]",
+        rng.choice(["1920 x 1080 (32-bit) 60Hz", "1366 x 768 (32-bit) 60Hz", "2560 x 1440 (32-bit) 60Hz"]),
+        "Video Chipset:\t\tIntel UHD Graphics 620",
+        "Audio Adapter:\t\tRealtek ALC3204",
+        "Network Card:\t\tIntel Wi-Fi 6 AX200",
+        "Network Card:\t\tIntel Ethernet I219-LM",
+        f"Maximum Link Speed:\t\tWi-Fi {rng.choice([433, 866, 1201])} Mbps",
+        f"Wear Level:\t\t{rng.randrange(1, 40)} %",
+        f"BIOS Version:\t\t1.{rng.randrange(30)}.0",
+        "UEFI Boot:\t\tPresent",
+    ]
+    if rng.random() < 0.7:
+        lines.append("Device:\t\tUSB\\VID_0BDA&PID_5520 Integrated Webcam")
+    return lines
+
+
+def device_lines(rng, index):
+    # Mostly keys the parser does not map, which is what dominates a full report.
+    vendor, device = rng.randrange(16 ** 4), rng.randrange(16 ** 4)
+    device_class = rng.choice(DEVICE_CLASSES)
+    lines = [
+        f"Device:\t\t{device_class} Device #{index}",
+        f"  Device Class:\t\t{device_class}",
+        f"  Hardware ID:\t\tPCI\\VEN_{vendor:04X}&DEV_{device:04X}&SUBSYS_{rng.randrange(16 ** 8):08X}&REV_{rng.randrange(256):02X}",
+        f"  Driver Version:\t\t{rng.randrange(1, 32)}.{rng.randrange(100)}.{rng.randrange(10000)}.{rng.randrange(10000)}",
+        f"  Driver Date:\t\t{rng.randrange(1, 13):02d}/{rng.randrange(1, 29):02d}/{rng.randrange(2015, 2025)}",
+        f"  Location:\t\tPCI bus {rng.randrange(8)}, device {rng.randrange(32)}, function {rng.randrange(8)}",
+        "  Status:\t\tOK",
+        "",
+    ]
+    for sensor in rng.sample(SENSORS, 3):
+        lines.append(f"  {sensor}:\t\t{rng.uniform(0, 100):.1f}")
+    return lines
+
+
+def report_lines(rng, unit, kind, devices):
+    lines = summary_lines(rng, unit)
+    if kind == "full":
+        for index in range(devices):
+            lines.extend(device_lines(rng, index))
+    return lines
+
+
+def write_report(path, lines, encoding):
+    # HWINFO writes UTF-16LE with a BOM; UTF-8 exports have none.
+    text = "\r\n".join(lines) + "\r\n"
+    with open(path, 'wb') as f:
+        if encoding == "utf-16le":
+            f.write(b'\xff\xfe')
+        f.write(text.encode(encoding))
+
+
+def generate_corpus(directory, kind, encoding, units, devices, seed):
+    rng = random.Random(f"{seed}-{kind}-{encoding}")
+    paths = []
+    for unit in range(units):
+        path = os.path.join(directory, f"{kind}-{encoding}-{unit:03d}.txt")
+        write_report(path, report_lines(rng, unit, kind, devices), encoding)
+        paths.append(path)
+    return paths
+
+
+FORM_DATA = {
+    'technician_initials': 'BM',
+    'warranty': True,
+    'warranty_date': '01/01/2027',
+    'power_adaptor': True,
+    'touchscreen': False,
+    'ports': '2x USB-A, 1x USB-C, HDMI',
+    'condition': 'Good'
+}
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def check_parser_assets(parser_module):
+    # A parser that cannot find webcam_ids.txt quietly stops detecting
+    # cameras by VID/PID, which would benchmark a different workload.
+    if not getattr(parser_module, "WEBCAM_IDS", None):
+        raise SystemExit(f"{parser_module.__file__} loaded no webcam IDs; pass --assets with the folder holding {parser_module.WEBCAM_IDS_FILE}")
+
+
+def load_modules(directory, assets_dir):
+    # Swaps in parser/template/utils from a module_cache or release folder the
+    # way the updater loads them, so an update can be measured against a
+    # baseline before (or after) check_for_updates installs it. Modules the
+    # folder does not have stay the source-tree ones. The parser reads its
+    # data files from assets_dir, not from next to the module.
+    from updater import load_module
+    os.environ[ASSETS_DIR_ENV] = assets_dir
+    loaded = {}
+    for file_name, names in MODULE_NAMES.items():
+        path = os.path.join(directory, file_name)
+        if not os.path.exists(path):
+            logging.warning("%s not found in %s; using the source tree copy", file_name, directory)
+            continue
+        module = load_module(file_name.replace('.py', ''), path)
+        if file_name == "parser.py":
+            check_parser_assets(module)
+        globals().update({name: getattr(module, name) for name in names})
+        loaded[file_name] = calculate_sha256(path)[:12]
+    return loaded
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered), 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        "min_ms": round(ordered[0], 3),
+        "samples": len(ordered),
+    }
+
+
+def bench_case(paths, template_path, output_dir, repeat):
+    template = get_compiled_template(template_path)
+    replacements = {placeholder: "Benchmark value" for _, placeholders in template.placeholder_paragraphs for placeholder in placeholders}
+    samples = {metric: [] for metric in METRICS}
+    for _ in range(repeat):
+        for path in paths:
+            elapsed, parsed = timed(parse_txt_file, path)
+            samples["parse"].append(elapsed)
+            profile = build_hardware_profile(*parsed)
+            samples["substitute"].append(timed(template.substitute, replacements)[0])
+            output_file = os.path.join(output_dir, "render.docx")
+            samples["render"].append(timed(fill_template, template_path, output_file, profile, FORM_DATA)[0])
+
+            start = time.perf_counter()
+            profile = build_hardware_profile(*parse_txt_file(path))
+            output_file = build_output_filename(output_dir, profile)
+            fill_template(template_path, output_file, profile, FORM_DATA)
+            samples["end_to_end"].append((time.perf_counter() - start) * 1000)
+    return {metric: summarize(values) for metric, values in samples.items()}
+
+
+def run_benchmarks(args):
+    if args.modules:
+        modules = load_modules(args.modules, args.assets)
+    else:
+        check_parser_assets(sys.modules["parser"])
+        modules = {}
+    cases = {}
+    with tempfile.TemporaryDirectory(prefix="rwh-bench-") as work_dir:
+        corpus_dir = args.keep_corpus or os.path.join(work_dir, "corpus")
+        output_dir = os.path.join(work_dir, "output")
+        os.makedirs(corpus_dir, exist_ok=True)
+        os.makedirs(output_dir)
+        # Compile the template up front so no case pays for it.
+        get_compiled_template(args.template)
+        for kind in args.kinds:
+            for encoding in args.encodings:
+                name = f"{kind}-{encoding}"
+                paths = generate_corpus(corpus_dir, kind, encoding, args.units, args.devices, args.seed)
+                sizes = [os.path.getsize(path) for path in paths]
+                logging.info("Benchmarking %s: %s report(s), %.0f KB each", name, len(paths), statistics.fmean(sizes) / 1024)
+                cases[name] = {
+                    "units": len(paths),
+                    "report_bytes": round(statistics.fmean(sizes)),
+                    "metrics": bench_case(paths, args.template, output_dir, args.repeat),
+                }
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parser_version": PARSER_VERSION,
+        "settings": {"units": args.units, "repeat": args.repeat, "devices": args.devices, "seed": args.seed,
+                     "template": os.path.basename(args.template), "modules": modules},
+        "cases": cases,
+    }
+
+
+def print_results(results):
+    modules = results.get("settings", {}).get("modules")
+    if modules:
+        print("Modules: " + ", ".join(f"{name} ({sha})" for name, sha in modules.items()))
+    print(f"{'case':<18} {'metric':<11} {'median ms':>10} {'p95 ms':>10} {'min ms':>10}")
+    for name, case in results["cases"].items():
+        for metric, stats in case["metrics"].items():
+            print(f"{name:<18} {metric:<11} {stats['median_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['min_ms']:>10.2f}")
+
+
+def compare(results, baseline, threshold):
+    # A metric regresses when its median is more than threshold slower than
+    # the baseline and the difference is above the noise floor.
+    regressions = []
+    print(f"\n{'case':<18} {'metric':<11} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, case in results["cases"].items():
+        baseline_case = baseline.get("cases", {}).get(name)
+        if not baseline_case:
+            print(f"{name:<18} (not in baseline)")
+            continue
+        for metric, stats in case["metrics"].items():
+            before = baseline_case["metrics"].get(metric, {}).get("median_ms")
+            if not before:
+                continue
+            after = stats["median_ms"]
+            change = after / before - 1
+            regressed = change > threshold and after - before > NOISE_FLOOR_MS
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<18} {metric:<11} {before:>10.2f} {after:>10.2f} {change:>+8.1%}{flag}")
+            if regressed:
+                regressions.append((name, metric, change))
+    return regressions
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark parsing and rendering against synthetic HWINFO reports.")
+    arg_parser.add_argument("-o", "--output", help="Write results to this JSON file")
+    arg_parser.add_argument("--compare", metavar="BASELINE", help="Compare against a results file and exit 1 on regressions")
+    arg_parser.add_argument("--input", metavar="RESULTS", help="Compare an existing results file instead of running")
+    arg_parser.add_argument("--threshold", type=float, default=0.15, help="Allowed slowdown before flagging a regression (default 0.15 = 15%%)")
+    arg_parser.add_argument("-t", "--template", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Template.docx"))
+    arg_parser.add_argument("--units", type=int, default=5, help="Synthetic reports per case")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Passes over each case's reports")
+    arg_parser.add_argument("--devices", type=int, default=400, help="Device blocks in a full report")
+    arg_parser.add_argument("--encodings", nargs="+", choices=ENCODINGS, default=ENCODINGS)
+    arg_parser.add_argument("--kinds", nargs="+", choices=KINDS, default=KINDS)
+    arg_parser.add_argument("--seed", type=int, default=1)
+    arg_parser.add_argument("--modules", metavar="DIR", help="Load parser.py, template.py and utils.py from this module_cache or release folder")
+    arg_parser.add_argument("--assets", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"),
+                            help="Data files (webcam_ids.txt, field_map.json) for a parser loaded with --modules (default: this install's assets)")
+    arg_parser.add_argument("--keep-corpus", metavar="DIR", help="Write the synthetic reports here and keep them")
+    arg_parser.add_argument("--log-level", default="WARNING")
+    args = arg_parser.parse_args()
+
+    configure_logging(level=args.log_level)
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+    else:
+        results = run_benchmarks(args)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}")
+            return 1
+        print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
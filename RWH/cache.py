@@ -0,0 +1,201 @@
+# cache.py
+import os
+import json
+import logging
+import tempfile
+import threading
+import time
+from sha256 import calculate_sha256
+from instrumentation import count
+
+APP_NAME = "RefurbHelper"
+PARSE_CACHE_DIR_ENV = "RWH_PARSE_CACHE_DIR"
+PARSE_CACHE_MAX_BYTES_ENV = "RWH_PARSE_CACHE_MAX_BYTES"
+DEFAULT_PARSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Eviction trims the cache to this fraction of max_bytes so the next few
+# writes do not trigger another full scan.
+PARSE_CACHE_TRIM_RATIO = 0.9
+# Temp files older than this are left over from interrupted writes.
+STALE_TEMP_SECONDS = 10 * 60
+IMAGE_CACHE_DIR_ENV = "RWH_IMAGE_CACHE_DIR"
+
+
+def app_data_dir(*parts):
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, APP_NAME, *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+_parser_fingerprints = {}
+
+def parser_version(parse_func):
+    # PARSER_VERSION, the loaded data files' PARSER_FINGERPRINT and a hash of
+    # the module that defines parse_func, so a parser hot-swapped in from
+    # module_cache never reuses stale results. The function's own globals are
+    # used because sys.modules may already hold a newer parser.
+    module_globals = parse_func.__globals__
+    version = module_globals.get('PARSER_VERSION', '0')
+    fingerprint = module_globals.get('PARSER_FINGERPRINT')
+    if fingerprint:
+        version = f"{version}-{fingerprint}"
+    module_file = module_globals.get('__file__')
+    if not module_file or not os.path.exists(module_file):
+        return version
+    stat = os.stat(module_file)
+    key = (module_file, stat.st_size, stat.st_mtime_ns)
+    if key not in _parser_fingerprints:
+        _parser_fingerprints[key] = calculate_sha256(module_file)[:12]
+    return f"{version}-{_parser_fingerprints[key]}"
+
+
+class ParseCache:
+    # On-disk cache of parse_txt_file results keyed by the SHA-256 of the log
+    # bytes and the parser version. Entries are small JSON files; a hit bumps
+    # the entry's mtime and writes evict the least recently used entries once
+    # the directory grows past max_bytes. The directory is scanned once to
+    # size it, then only again when the running total crosses max_bytes.
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.environ.get(PARSE_CACHE_DIR_ENV) or app_data_dir("parse_cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes or int(os.environ.get(PARSE_CACHE_MAX_BYTES_ENV, DEFAULT_PARSE_CACHE_MAX_BYTES))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _entry_path(self, file_path, parse_func):
+        return os.path.join(self.cache_dir, f"{calculate_sha256(file_path)}-{parser_version(parse_func)}.json")
+
+    def parse(self, file_path, parse_func):
+        entry_path = self._entry_path(file_path, parse_func)
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(entry_path)
+            with self._lock:
+                self.hits += 1
+            count("parse_cache_hits")
+            logging.debug("Parse cache hit for %s", file_path)
+            return entry['data'], entry['camera_found'], entry['keyname_fallback']
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning("Ignoring unreadable parse cache entry %s: %s", entry_path, e)
+
+        with self._lock:
+            self.misses += 1
+        logging.debug("Parse cache miss for %s", file_path)
+        data, camera_found, keyname_fallback = parse_func(file_path)
+        self._store(entry_path, {'data': data, 'camera_found': camera_found, 'keyname_fallback': keyname_fallback})
+        return data, camera_found, keyname_fallback
+
+    def _store(self, entry_path, entry):
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, entry_path)
+        except OSError as e:
+            logging.warning("Failed to write parse cache entry %s: %s", entry_path, e)
+            return
+        with self._lock:
+            if self._total_bytes is None:
+                self._evict()
+            else:
+                self._total_bytes += size
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+
+    def _evict(self):
+        # Sizes the directory, clears out stale temp files and, when over
+        # max_bytes, removes the least recently used entries. Other processes
+        # share the directory, so this rescan also corrects the running total.
+        entries = []
+        total = 0
+        stale_before = time.time() - STALE_TEMP_SECONDS
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file():
+                continue
+            stat = entry.stat()
+            if entry.name.endswith('.json'):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            elif entry.name.endswith('.tmp') and stat.st_mtime < stale_before:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+        if total > self.max_bytes:
+            target = self.max_bytes * PARSE_CACHE_TRIM_RATIO
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    continue
+                if total <= target:
+                    break
+        self._total_bytes = total
+
+
+_default_cache = None
+
+def get_parse_cache():
+    global _default_cache
+    if _default_cache is None:
+        try:
+            _default_cache = ParseCache()
+        except OSError as e:
+            logging.warning("Parse cache unavailable: %s", e)
+            return None
+    return _default_cache
+
+
+def cached_parse(file_path, parse_func):
+    # A missing or unwritable cache directory must never stop a worksheet from
+    # being generated, so fall back to parsing directly.
+    cache = get_parse_cache()
+    if cache is None:
+        return parse_func(file_path)
+    return cache.parse(file_path, parse_func)
+
+
+def image_cache_dir():
+    try:
+        return os.environ.get(IMAGE_CACHE_DIR_ENV) or app_data_dir("image_cache")
+    except OSError as e:
+        logging.warning("Image cache unavailable, using the temp directory: %s", e)
+        return tempfile.gettempdir()
+
+
+def cached_image(source_path, width, height, fit=False):
+    # Returns the path of a PNG of source_path resized to width x height, or
+    # with fit, scaled to width and capped at height keeping its aspect ratio.
+    # Keyed by the source's hash and the requested size, so startup only has
+    # to hand Tk a ready-made PNG; PIL is imported on a miss only.
+    cache_dir = image_cache_dir()
+    mode = "fit" if fit else "exact"
+    cached_path = os.path.join(cache_dir, f"{calculate_sha256(source_path)[:16]}-{width}x{height}-{mode}.png")
+    if os.path.exists(cached_path):
+        return cached_path
+
+    from PIL import Image
+    with Image.open(source_path) as img:
+        if fit:
+            img_width, img_height = img.size
+            target_width = width
+            target_height = int((target_width / img_width) * img_height)
+            if target_height > height:
+                target_height = height
+                target_width = int((target_height / img_height) * img_width)
+        else:
+            target_width, target_height = width, height
+        resized = img.resize((target_width, target_height), Image.LANCZOS)
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        resized.save(f, format="PNG")
+    os.replace(temp_path, cached_path)
+    logging.debug("Cached resized %s as %s", source_path, cached_path)
+    return cached_path
@@ -1,139 +1,75 @@
 # core.py
-import json
-import hashlib
-import importlib.util
 import os
 import ctypes
-import shutil
 import sys
+import queue
+import importlib
+import importlib.util
 import logging
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from PIL import Image, ImageTk
-import win32gui
-import win32con
-from datetime import datetime
-import requests
+from instrumentation import configure_logging, metrics_run, stage
+from cache import cached_parse, cached_image
 
 # Constants for window styles
 GWL_EXSTYLE = -20
 WS_EX_APPWINDOW = 0x00040000
 WS_EX_TOOLWINDOW = 0x00000080
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Update configuration
-GITHUB_REPO = "https://api.github.com/repos/KyleJamesOlson/RefurbHelper/contents/RWH"
-LOCAL_CACHE = os.path.join(os.path.dirname(sys.executable), "module_cache")
-VERSIONS_FILE = "versions.json"
-CURRENT_VERSIONS = {
-    "parser.py": "1.0.0",
-    "template.py": "1.0.0",
-    "utils.py": "1.0.0"
+# Set up logging (level from RWH_LOG_LEVEL, INFO by default; RWH_STAGE_TIMING=1 adds per-stage timings)
+configure_logging()
+
+# Functions core.py takes from the generation modules. They are imported on
+# first use (or by the warm-up thread once the window is up) because they pull
+# in docx and chardet, which the first paint does not need. Anything an update
+# has already swapped into globals() is left alone.
+# utils comes first: the bundled template.py imports it by name.
+GENERATION_EXPORTS = {
+    "utils": ["replace_in_runs", "process_element", "build_output_filename"],
+    "parser": ["parse_txt_file", "build_hardware_profile"],
+    "template": ["fill_template"],
 }
+_generation_lock = threading.Lock()
 
-def calculate_sha256(file_path):
-    sha256 = hashlib.sha256()
-    with open(file_path, 'rb') as f:
-        while chunk := f.read(8192):
-            sha256.update(chunk)
-    return sha256.hexdigest()
-
-def load_module(module_name, file_path):
-    spec = importlib.util.spec_from_file_location(module_name, file_path)
-    if spec is None:
-        logging.error(f"Failed to create spec for {file_path}")
-        return None
+def load_bundled_module(module_name):
+    # Same as updater.load_module, kept here so the warm-up thread does not
+    # import updater (and requests with it).
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(sys._MEIPASS, 'assets', f"{module_name}.py"))
     module = importlib.util.module_from_spec(spec)
     sys.modules[module_name] = module
     spec.loader.exec_module(module)
     return module
 
-def check_for_updates():
-    try:
-        os.makedirs(LOCAL_CACHE, exist_ok=True)
-        api_url = GITHUB_API_URL
-        logging.debug(f"Checking updates from API: {api_url}")
-        response = requests.get(api_url, timeout=10)
-        response.raise_for_status()  # Raise an exception for bad status codes (e.g., 404)
-        contents = response.json()
-        logging.debug(f"API response: {contents}")
-
-        # Fetch versions.json to get version and SHA information
-        versions_url = next(item["download_url"] for item in contents if item["name"] == VERSIONS_FILE)
-        versions_response = requests.get(versions_url, timeout=10)
-        versions_response.raise_for_status()
-        server_versions = versions_response.json().get("modules", {})
-        logging.debug(f"Loaded versions: {server_versions}")
-
-        for item in contents:
-            module_name = item["name"]
-            if module_name not in ["parser.py", "template.py", "utils.py"]:
+def load_generation_modules():
+    with _generation_lock:
+        for module_name, names in GENERATION_EXPORTS.items():
+            if all(name in globals() for name in names):
                 continue
-            server_info = server_versions.get(module_name, {})
-            server_version = server_info.get("version", "0.0.0")
-            server_sha256 = server_info.get("sha256", "")
-            server_url = item["download_url"]
-            local_file = os.path.join(LOCAL_CACHE, module_name)
-            current_version = CURRENT_VERSIONS.get(module_name, "0.0.0")
-            logging.debug(f"Checking {module_name}: Current={current_version}, Server={server_version}")
-            if server_version > current_version:
-                logging.info(f"Update available for {module_name}: {current_version} -> {server_version}")
-                response = requests.get(server_url, timeout=10)
-                response.raise_for_status()
-                with open(local_file, 'wb') as f:
-                    f.write(response.content)
-                local_sha256 = calculate_sha256(local_file)
-                if local_sha256 != server_sha256:
-                    logging.error(f"Checksum mismatch for {module_name}. Discarding update.")
-                    os.remove(local_file)
-                    continue
-                CURRENT_VERSIONS[module_name] = server_version
-                logging.info(f"Successfully downloaded {module_name} v{server_version}")
-        for module_name in server_versions:
-            local_file = os.path.join(LOCAL_CACHE, module_name)
-            if os.path.exists(local_file):
-                module = load_module(module_name.replace('.py', ''), local_file)
-                if module:
-                    logging.info(f"Loaded updated module {module_name}")
-                    if module_name == "parser.py":
-                        globals()['parse_txt_file'] = module.parse_txt_file
-                    elif module_name == "template.py":
-                        globals()['fill_template'] = module.fill_template
-                    elif module_name == "utils.py":
-                        globals()['replace_in_runs'] = module.replace_in_runs
-                        globals()['process_element'] = module.process_element
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Update check failed (network issue): {str(e)}", exc_info=True)
-        messagebox.showwarning("Update Warning", "Failed to check for updates from GitHub. Using default modules.")
-    except Exception as e:
-        logging.error(f"Update check failed: {str(e)}", exc_info=True)
-        messagebox.showwarning("Update Warning", "Failed to check for updates. Using default modules.")
-
-
-# Fallback to bundled modules
-if getattr(sys, 'frozen', False):
-    for module_name in ["parser.py", "template.py", "utils.py"]:
-        if module_name == "parser.py" and 'parse_txt_file' not in globals():
-            bundled_file = os.path.join(sys._MEIPASS, 'assets', module_name)
-            module = load_module(module_name.replace('.py', ''), bundled_file)
-            globals()['parse_txt_file'] = module.parse_txt_file
-        elif module_name == "template.py" and 'fill_template' not in globals():
-            bundled_file = os.path.join(sys._MEIPASS, 'assets', module_name)
-            module = load_module(module_name.replace('.py', ''), bundled_file)
-            globals()['fill_template'] = module.fill_template
-        elif module_name == "utils.py" and 'process_element' not in globals():
-            bundled_file = os.path.join(sys._MEIPASS, 'assets', module_name)
-            module = load_module(module_name.replace('.py', ''), bundled_file)
-            globals()['replace_in_runs'] = module.replace_in_runs
-            globals()['process_element'] = module.process_element
-else:
-    from parser import parse_txt_file
-    from template import fill_template
-    from utils import replace_in_runs, process_element
-
-check_for_updates()
+            if getattr(sys, 'frozen', False):
+                # Fallback to bundled modules
+                module = load_bundled_module(module_name)
+            else:
+                module = importlib.import_module(module_name)
+            for name in names:
+                globals().setdefault(name, getattr(module, name))
+
+# Images the window shows: (file in assets, width, height, fit). With fit the
+# image keeps its aspect ratio at full width, capped at the given height.
+IMAGE_ASSETS = {
+    "close": ("icon.ico", 20, 20, False),
+    "background": ("background.png", 540, 600, False),
+    "logo": ("Logo1.png", 540, 100, True),
+}
+
+def asset_image(name):
+    # Resized copies come from the image cache, so Tk loads them as-is.
+    file_name, width, height, fit = IMAGE_ASSETS[name]
+    return tk.PhotoImage(file=cached_image(os.path.join("assets", file_name), width, height, fit))
+
+UPDATE_POLL_MS = 200
+GENERATION_POLL_MS = 100
+WARMUP_DELAY_MS = 100
 
 class AssetFormFiller(tk.Tk):
     def __init__(self):
@@ -152,7 +88,7 @@ class AssetFormFiller(tk.Tk):
                 icon_path = os.path.join("assets", "icon.ico")
             self.iconbitmap(default=icon_path)
         except Exception as e:
-            logging.error(f"Failed to set window icon: {str(e)}")
+            logging.error("Failed to set window icon: %s", e)
 
         # Adjust window style to show in taskbar
         self.set_appwindow()
@@ -171,8 +107,8 @@ class AssetFormFiller(tk.Tk):
         self.title_label.pack(side=tk.LEFT, pady=5)
 
         try:
-            close_img = Image.open(os.path.join("assets", "icon.ico")).resize((20, 20), Image.LANCZOS)
-            self.close_icon = ImageTk.PhotoImage(close_img)
+            with stage("startup.image", image="close"):
+                self.close_icon = asset_image("close")
             self.close_button = tk.Button(
                 self.title_bar, 
                 image=self.close_icon, 
@@ -182,7 +118,7 @@ class AssetFormFiller(tk.Tk):
             )
             self.close_button.pack(side=tk.RIGHT, padx=5)
         except Exception as e:
-            logging.error(f"Failed to load close button icon: {str(e)}")
+            logging.error("Failed to load close button icon: %s", e)
             self.close_button = tk.Button(
                 self.title_bar, 
                 text="X", 
@@ -250,29 +186,22 @@ class AssetFormFiller(tk.Tk):
             background="#f0f0f0"
 	)
         try:
-            bg_img = Image.open(os.path.join("assets", "background.png")).resize((540, 600), Image.LANCZOS)
-            self.background_image = ImageTk.PhotoImage(bg_img)
+            with stage("startup.image", image="background"):
+                self.background_image = asset_image("background")
             self.background_label = tk.Label(self, image=self.background_image)
             self.background_label.place(x=0, y=0, relwidth=1, relheight=1)
             self.background_label.lower()
         except Exception as e:
-            logging.error(f"Failed to load background image: {str(e)}")
+            logging.error("Failed to load background image: %s", e)
             self.configure(bg="#f0f0f0")
 
         try:
-            logo_img = Image.open(os.path.join("assets", "Logo1.png"))
-            img_width, img_height = logo_img.size
-            target_width = 540
-            target_height = int((target_width / img_width) * img_height)
-            if target_height > 100:
-                target_height = 100
-                target_width = int((target_height / img_height) * img_width)
-            logo_img = logo_img.resize((target_width, target_height), Image.LANCZOS)
-            self.logo_image = ImageTk.PhotoImage(logo_img)
+            with stage("startup.image", image="logo"):
+                self.logo_image = asset_image("logo")
             self.logo_label = tk.Label(self.main_frame, image=self.logo_image, bg="#f0f0f0")
             self.logo_label.grid(row=0, column=0, columnspan=3, pady=(10, 0), sticky="ew")
         except Exception as e:
-            logging.error(f"Failed to load logo image: {str(e)}")
+            logging.error("Failed to load logo image: %s", e)
             self.logo_label = tk.Label(self.main_frame, text="Spectrum E-cycle", font=("Roboto", 14, "bold"), bg="#f0f0f0")
             self.logo_label.grid(row=0, column=0, columnspan=3, pady=(10, 0), sticky="ew")
 
@@ -291,11 +220,29 @@ class AssetFormFiller(tk.Tk):
         if os.path.exists(default_template):
             self.template_path.set(default_template)
         else:
-            logging.warning(f"Default template file {default_template} not found")
+            logging.warning("Default template file %s not found", default_template)
+
+        self.pending_updates = None
+        self.update_results = queue.Queue()
+        self.update_status = tk.StringVar()
+        # Forms are generated one at a time on a worker thread so the window
+        # stays responsive and the next unit can be entered meanwhile.
+        self.active_jobs = []
+        self.generation_jobs = queue.Queue()
+        self.generation_results = queue.Queue()
+        self.generation_status = tk.StringVar()
+        threading.Thread(target=self.run_generation_worker, name="generation", daemon=True).start()
 
         self.create_file_inputs()
         self.create_form_inputs()
         self.create_submit_button()
+        self.create_progress_bar()
+        self.create_status_bar()
+
+        # Check for updates and load the generation modules once the window is
+        # up instead of blocking startup on the network and docx.
+        self.after(WARMUP_DELAY_MS, self.start_warmup)
+        self.after(500, self.start_update_check)
 
     def set_appwindow(self):
         try:
@@ -307,7 +254,7 @@ class AssetFormFiller(tk.Tk):
             self.wm_withdraw()
             self.after(10, lambda: self.wm_deiconify())
         except Exception as e:
-            logging.error(f"Failed to set appwindow style: {str(e)}")
+            logging.error("Failed to set appwindow style: %s", e)
 
     def start_move(self, event):
         self.x_root = event.x_root
@@ -324,10 +271,12 @@ class AssetFormFiller(tk.Tk):
 
     def minimize_window(self):
         try:
+            import win32gui
+            import win32con
             hwnd = win32gui.GetForegroundWindow()
             win32gui.ShowWindow(hwnd, win32con.SW_MINIMIZE)
         except Exception as e:
-            logging.error(f"Failed to minimize window: {str(e)}")
+            logging.error("Failed to minimize window: %s", e)
             messagebox.showerror("Error", "Unable to minimize window")
 
     def create_file_inputs(self):
@@ -392,13 +341,12 @@ class AssetFormFiller(tk.Tk):
             messagebox.showerror("Error", "Please enter warranty expiration date")
             return
 
-        try:
-            data, camera_found, keyname_fallback = parse_txt_file(self.data_path.get())
-            brand_name = data.get(next((key for key in data if 'Computer Brand Name' in data[key]), None), {}).get('Computer Brand Name', 'Unknown').replace(" ", "_")
-            serial_number = data.get(next((key for key in data if 'Product Serial Number' in data[key]), None) or next((key for key in data if key == "System"), None), {}).get('Product Serial Number', 'Unknown')
-            current_date = datetime.now().strftime("%m/%d/%Y").replace("/", "")
-            output_file = os.path.join(self.output_path.get(), f"{brand_name}_{serial_number}_{current_date}.docx")
-            form_data = {
+        # Tk variables may only be read on this thread, so the worker gets a snapshot.
+        job = {
+            'data_path': self.data_path.get(),
+            'template_path': self.template_path.get(),
+            'output_path': self.output_path.get(),
+            'form_data': {
                 'technician_initials': self.technician_initials.get(),
                 'warranty': self.warranty.get(),
                 'warranty_date': self.warranty_date.get(),
@@ -406,14 +354,160 @@ class AssetFormFiller(tk.Tk):
                 'touchscreen': self.touchscreen.get(),
                 'ports': self.ports.get(),
                 'condition': self.condition.get()
-            }
-            fill_template(self.template_path.get(), output_file, data, camera_found, form_data, keyname_fallback)
-            messagebox.showinfo("Success", f"Form filled and saved as {output_file}")
+            },
+            'cancel': threading.Event(),
+        }
+        self.active_jobs.append(job)
+        self.generation_jobs.put(job)
+        if len(self.active_jobs) == 1:
+            self.progress_bar.start(10)
+            self.cancel_button.state(['!disabled'])
+            self.after(GENERATION_POLL_MS, self.poll_generation)
+        self.show_generation_status(f"Queued {os.path.basename(job['data_path'])}")
+
+    def run_generation_worker(self):
+        while True:
+            job = self.generation_jobs.get()
+            self.generation_results.put(self.generate(job))
+
+    def generate(self, job):
+        # Runs on the worker thread. Cancellation is honoured between stages;
+        # a document that has started saving is finished.
+        log_name = os.path.basename(job['data_path'])
+        try:
+            # Every run, including failed ones, leaves a metrics file behind.
+            with metrics_run("generate", log=log_name) as run:
+                if job['cancel'].is_set():
+                    return "cancelled", job, log_name
+                self.generation_results.put(("progress", job, f"Parsing {log_name}..."))
+                with stage("load_modules"):
+                    # Normally already done by the warm-up thread; waits for it if it is still going.
+                    load_generation_modules()
+                with stage("parse"):
+                    profile = build_hardware_profile(*cached_parse(job['data_path'], parse_txt_file))
+                if job['cancel'].is_set():
+                    return "cancelled", job, log_name
+                output_file = build_output_filename(job['output_path'], profile)
+                self.generation_results.put(("progress", job, f"Writing {os.path.basename(output_file)}..."))
+                with stage("render"):
+                    fill_template(job['template_path'], output_file, profile, job['form_data'])
+            logging.info("Generated %s in %s", output_file, run.summary())
+            return "done", job, f"Saved {os.path.basename(output_file)} in {run.summary()}"
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+            logging.error("Failed to generate form for %s: %s", log_name, e, exc_info=True)
+            return "error", job, str(e)
+
+    def poll_generation(self):
+        while True:
+            try:
+                status, job, result = self.generation_results.get_nowait()
+            except queue.Empty:
+                break
+            if status == "progress":
+                self.show_generation_status(result)
+                continue
+            self.active_jobs.remove(job)
+            if status == "done":
+                self.show_generation_status(result)
+            elif status == "cancelled":
+                self.show_generation_status(f"Cancelled {result}")
+            else:
+                messagebox.showerror("Error", f"An error occurred: {result}")
+                self.show_generation_status("")
+        if self.active_jobs:
+            self.after(GENERATION_POLL_MS, self.poll_generation)
+            return
+        self.progress_bar.stop()
+        self.cancel_button.state(['disabled'])
+        self.apply_pending_updates()
+
+    def show_generation_status(self, message):
+        queued = len(self.active_jobs) - 1
+        self.generation_status.set(f"{message} ({queued} more queued)" if queued > 0 else message)
+
+    def cancel_generation(self):
+        for job in self.active_jobs:
+            job['cancel'].set()
+        self.show_generation_status("Cancelling...")
 
     def create_submit_button(self):
         ttk.Button(self.main_frame, text="Generate Form", command=self.submit, style="TButton").grid(row=10, column=1, pady=20)
+        self.cancel_button = ttk.Button(self.main_frame, text="Cancel", command=self.cancel_generation, style="TButton")
+        self.cancel_button.grid(row=10, column=2, padx=10, pady=20)
+        self.cancel_button.state(['disabled'])
+
+    def create_progress_bar(self):
+        self.progress_bar = ttk.Progressbar(self.main_frame, mode="indeterminate")
+        self.progress_bar.grid(row=11, column=0, columnspan=3, padx=10, sticky="ew")
+        tk.Label(self.main_frame, textvariable=self.generation_status, bg="#f0f0f0", fg="black", font=("Roboto", 9), wraplength=520, justify="left").grid(row=12, column=0, columnspan=3, padx=10, sticky="w")
+
+    def create_status_bar(self):
+        tk.Label(self.main_frame, textvariable=self.update_status, bg="#f0f0f0", fg="#555555", font=("Roboto", 8)).grid(row=13, column=0, columnspan=3, padx=10, sticky="w")
+
+    def start_warmup(self):
+        threading.Thread(target=self.run_warmup, name="warm-up", daemon=True).start()
+
+    def run_warmup(self):
+        try:
+            load_generation_modules()
+            logging.debug("Generation modules loaded")
+        except Exception as e:
+            # Generate retries the import and reports the error to the user.
+            logging.error("Failed to preload generation modules: %s", e, exc_info=True)
+
+    def start_update_check(self):
+        self.update_status.set("Checking for updates...")
+        threading.Thread(target=self.run_update_check, name="update-check", daemon=True).start()
+        self.after(UPDATE_POLL_MS, self.poll_update_check)
+
+    def run_update_check(self):
+        # requests and the updater are only needed on this thread. ImportError
+        # is caught first: the requests clause below cannot be evaluated if
+        # requests itself failed to import.
+        try:
+            import requests
+            from updater import check_for_updates
+            with metrics_run("update_check") as run:
+                updates = check_for_updates()
+            logging.info("Update check finished in %s", run.summary())
+            self.update_results.put(("ok", (updates, run.wall_ms)))
+        except ImportError as e:
+            logging.error("Update check unavailable: %s", e, exc_info=True)
+            self.update_results.put(("error", "Update check unavailable. Using default modules."))
+        except requests.exceptions.RequestException as e:
+            logging.error("Update check failed (network issue): %s", e, exc_info=True)
+            self.update_results.put(("error", "Update check failed (offline?). Using default modules."))
+        except Exception as e:
+            logging.error("Update check failed: %s", e, exc_info=True)
+            self.update_results.put(("error", "Update check failed. Using default modules."))
+
+    def poll_update_check(self):
+        try:
+            status, result = self.update_results.get_nowait()
+        except queue.Empty:
+            self.after(UPDATE_POLL_MS, self.poll_update_check)
+            return
+        if status == "error":
+            self.update_status.set(result)
+            return
+        updates, elapsed_ms = result
+        if updates:
+            self.pending_updates = updates
+            self.apply_pending_updates()
+        else:
+            self.update_status.set(f"Modules up to date (checked in {elapsed_ms / 1000:.1f} s)")
+
+    def apply_pending_updates(self):
+        # Only swap modules between generations so a form in progress never mixes versions.
+        if not self.pending_updates:
+            return
+        if self.active_jobs:
+            self.update_status.set("Updates downloaded; applying after the queued forms")
+            return
+        globals().update(self.pending_updates)
+        logging.info("Applied updated functions: %s", ', '.join(sorted(self.pending_updates)))
+        self.pending_updates = None
+        self.update_status.set("Updated modules loaded")
 
 if __name__ == "__main__":
     try:
@@ -421,5 +515,5 @@ if __name__ == "__main__":
         logging.debug("AssetFormFiller initialized successfully")
         app.mainloop()
     except Exception as e:
-        logging.error(f"Failed to initialize AssetFormFiller: {str(e)}")
+        logging.error("Failed to initialize AssetFormFiller: %s", e)
         raise
@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('assets', 'assets'), ('Template.docx', '.'), ('parser.py', 'assets'), ('template.py', 'assets'), ('utils.py', 'assets'), ('assets/icon.ico', 'assets'), ('assets/background.png', 'assets'), ('assets/Logo1.png', 'assets')],
-    hiddenimports=[],
+    hiddenimports=['docx', 'docx.opc.oxml', 'docx.oxml', 'docx.oxml.ns', 'docx.shared', 'docx.text.paragraph', 'lxml', 'lxml.etree', 'chardet'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
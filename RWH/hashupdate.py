@@ -1,37 +1,158 @@
-import hashlib
+# hashupdate.py
+# Release tool: hashes the modules on the update share, bumps the version of
+# every module whose hash changed, and publishes versions.json (signed with
+# the release key) plus the update bundle.
+#   python hashupdate.py --signing-key release_key.txt [--server PATH] [--bump patch|minor|major] [--dry-run]
+import argparse
 import json
 import os
+import sys
+import tempfile
+import zipfile
+from cache import app_data_dir
+from sha256 import calculate_sha256, hash_files
+from signing import load_private_key, public_key_hex, sign_versions, verify_versions
 
 SERVER_PATH = r"\\192.168.5.70\SE Stuff\RWH"
-VERSIONS_FILE = os.path.join(SERVER_PATH, "versions.json")
+VERSIONS_NAME = "versions.json"
+# Single compressed archive of every module plus manifest.json, so clients
+# can fetch an update in one request and install it all at once.
+BUNDLE_NAME = "update_bundle.zip"
+BUNDLE_MANIFEST = "manifest.json"
 files = ['parser.py', 'template.py', 'utils.py']
-versions = {
-    "parser.py": "1.0.0",  # Update these manually or increment programmatically
-    "template.py": "1.0.0",
-    "utils.py": "1.0.0"
-}
-
-def calculate_sha256(file_path):
-    sha256 = hashlib.sha256()
-    with open(file_path, 'rb') as f:
-        while chunk := f.read(8192):
-            sha256.update(chunk)
-    return sha256.hexdigest()
-
-# Generate versions.json
-versions_data = {"modules": {}}
-for file in files:
-    file_path = os.path.join(SERVER_PATH, file)
-    if os.path.exists(file_path):
-        hash_value = calculate_sha256(file_path)
-        versions_data["modules"][file] = {
-            "version": versions[file],
-            "sha256": hash_value,
-            "path": file
-        }
-    else:
-        print(f"File not found: {file_path}")
-
-with open(VERSIONS_FILE, 'w') as f:
-    json.dump(versions_data, f, indent=2)
-print(f"Updated {VERSIONS_FILE}")
\ No newline at end of file
+INITIAL_VERSION = "1.0.0"
+SIGNING_KEY_ENV = "RWH_SIGNING_KEY"
+# Kept in this machine's app data directory rather than on the share or in
+# the source tree: (path, size, mtime) -> sha256, so unchanged modules are not
+# read back over SMB on every run.
+HASH_INDEX_NAME = "hash_index.json"
+
+def hash_index_file():
+    return os.path.join(app_data_dir("release"), HASH_INDEX_NAME)
+
+def load_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return default
+
+def save_json(path, data):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix=".part")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(temp_path, path)
+
+def hash_modules(paths, index, workers):
+    hashes = {}
+    stale = []
+    for path in paths:
+        st = os.stat(path)
+        entry = index.get(os.path.abspath(path))
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            hashes[path] = entry["sha256"]
+        else:
+            stale.append((path, st))
+    for (path, st), (_, result) in zip(stale, hash_files([path for path, _ in stale], workers)):
+        if isinstance(result, OSError):
+            raise result
+        index[os.path.abspath(path)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": result}
+        hashes[path] = result
+    return hashes, len(stale)
+
+def bump_version(version, part):
+    major, minor, patch = (int(x) for x in (version.split(".") + ["0", "0"])[:3])
+    if part == "major":
+        return f"{major + 1}.0.0"
+    if part == "minor":
+        return f"{major}.{minor + 1}.0"
+    return f"{major}.{minor}.{patch + 1}"
+
+def write_bundle(server_path, modules):
+    # Written under a temp name and moved into place, so a client never sees
+    # a half-written bundle.
+    fd, temp_path = tempfile.mkstemp(dir=server_path, prefix=BUNDLE_NAME, suffix=".part")
+    os.close(fd)
+    with zipfile.ZipFile(temp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=9) as bundle:
+        bundle.writestr(BUNDLE_MANIFEST, json.dumps({"modules": modules}, indent=2))
+        for file in modules:
+            bundle.write(os.path.join(server_path, file), file)
+    bundle_path = os.path.join(server_path, BUNDLE_NAME)
+    os.replace(temp_path, bundle_path)
+    return {"file": BUNDLE_NAME, "sha256": calculate_sha256(bundle_path), "size": os.path.getsize(bundle_path)}
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Publish module versions and the update bundle to the update share.")
+    arg_parser.add_argument("--server", default=SERVER_PATH, help="Folder clients update from")
+    arg_parser.add_argument("--bump", choices=["patch", "minor", "major"], default="patch", help="Version part to bump for changed modules")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=8, help="Files hashed in parallel")
+    arg_parser.add_argument("--signing-key", default=os.environ.get(SIGNING_KEY_ENV), help="Ed25519 private key file (python signing.py generate-key); default: RWH_SIGNING_KEY")
+    arg_parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing anything")
+    args = arg_parser.parse_args(argv)
+
+    private_key = None
+    if not args.dry_run:
+        if not args.signing_key:
+            print(f"A signing key is required (--signing-key or {SIGNING_KEY_ENV}); clients reject unsigned versions.json")
+            return 1
+        try:
+            private_key = load_private_key(args.signing_key)
+        except (OSError, ValueError) as e:
+            print(f"Cannot load signing key {args.signing_key}: {e}")
+            return 1
+
+    versions_file = os.path.join(args.server, VERSIONS_NAME)
+    previous = load_json(versions_file, {})
+    previous_modules = previous.get("modules", {})
+    paths = {}
+    for file in files:
+        file_path = os.path.join(args.server, file)
+        if os.path.exists(file_path):
+            paths[file] = file_path
+        else:
+            print(f"File not found: {file_path}")
+
+    index_file = hash_index_file()
+    index = load_json(index_file, {})
+    hashes, rehashed = hash_modules(list(paths.values()), index, args.jobs)
+    print(f"Hashed {rehashed} of {len(paths)} modules; the rest were unchanged since the last run")
+
+    modules = {}
+    changed = False
+    for file, file_path in paths.items():
+        hash_value = hashes[file_path]
+        entry = previous_modules.get(file)
+        if entry is None:
+            version = INITIAL_VERSION
+        elif entry.get("sha256") != hash_value:
+            version = bump_version(entry.get("version", INITIAL_VERSION), args.bump)
+        else:
+            version = entry["version"]
+        if entry is None or entry.get("sha256") != hash_value:
+            print(f"{file}: {entry['version'] if entry else 'new'} -> {version}")
+            changed = True
+        modules[file] = {"version": version, "sha256": hash_value, "path": file}
+    changed |= modules.keys() != previous_modules.keys()
+
+    if not args.dry_run:
+        save_json(index_file, index)
+    bundle = previous.get("bundle")
+    signed = private_key is None or verify_versions(previous, public_key_hex(private_key))
+    if not changed and signed and bundle and os.path.exists(os.path.join(args.server, bundle["file"])):
+        # Leaving versions.json untouched keeps clients on cheap 304s.
+        print(f"No module changed; {versions_file} left as is")
+        return 0
+    if args.dry_run:
+        return 0
+
+    versions_data = {"modules": modules}
+    # The bundle goes first so versions.json never advertises one that is not there yet.
+    if modules:
+        versions_data["bundle"] = write_bundle(args.server, modules)
+        print(f"Updated {BUNDLE_NAME}")
+    save_json(versions_file, sign_versions(versions_data, private_key))
+    print(f"Updated {versions_file}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
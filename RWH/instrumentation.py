@@ -0,0 +1,278 @@
+# instrumentation.py
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+LOG_LEVEL_ENV = "RWH_LOG_LEVEL"
+STAGE_TIMING_ENV = "RWH_STAGE_TIMING"
+DEFAULT_LOG_LEVEL = "INFO"
+METRICS_DIR_ENV = "RWH_METRICS_DIR"
+METRICS_KEEP = 200  # newest metrics files kept in the metrics directory
+MEMORY_PROFILE_ENV = "RWH_MEMORY_PROFILE"
+MEMORY_TOP_SITES = 10
+
+timing_logger = logging.getLogger("rwh.timing")
+_stage_timing = os.environ.get(STAGE_TIMING_ENV, "").lower() in ("1", "true", "yes", "on")
+# The run (if any) that stages and counters on this thread are recorded into,
+# so a Generate on the worker thread and the update check never mix.
+_current = threading.local()
+_memory_profile = False
+
+
+def resolve_log_level(level=None):
+    # An explicit level wins over RWH_LOG_LEVEL, which wins over the default.
+    level = level or os.environ.get(LOG_LEVEL_ENV) or DEFAULT_LOG_LEVEL
+    if isinstance(level, int):
+        return level
+    resolved = logging.getLevelName(str(level).upper())
+    if not isinstance(resolved, int):
+        logging.warning("Unknown log level %s, using %s", level, DEFAULT_LOG_LEVEL)
+        return logging.getLevelName(DEFAULT_LOG_LEVEL)
+    return resolved
+
+
+def configure_logging(level=None, stage_timing=None, fmt=LOG_FORMAT):
+    global _stage_timing
+    # force: importing the parser may already have auto-configured the root logger.
+    logging.basicConfig(level=resolve_log_level(level), format=fmt, force=True)
+    if stage_timing is not None:
+        _stage_timing = stage_timing
+    if _stage_timing:
+        timing_logger.setLevel(logging.INFO)
+
+
+def stage_timing_enabled():
+    return _stage_timing
+
+
+def enable_memory_profiling(frames=1):
+    # tracemalloc slows allocation-heavy code down noticeably, so it is only
+    # started on request (RWH_MEMORY_PROFILE=1 or a --memory-profile flag).
+    # It sees Python allocations only; lxml's own tree memory is not traced.
+    global _memory_profile
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _memory_profile = True
+
+
+def memory_profiling_enabled():
+    return _memory_profile
+
+
+# tracemalloc's traced total and peak are process-wide, so only one thread
+# profiles at a time; otherwise runs overlapping on different threads
+# (Generate and the update check in the GUI) would reset each other's peak.
+# A run that starts while another thread is profiling skips memory capture
+# rather than wait for it.
+_memory_lock = threading.RLock()
+
+
+def _memory_enter():
+    # Each open stage/run keeps (traced bytes at entry, highest peak seen by
+    # its children). tracemalloc has one global peak, so it is reset on entry
+    # and the parent's running peak is carried on this stack instead.
+    import tracemalloc
+    frames = _current.__dict__.setdefault("memory_frames", [])
+    current, peak = tracemalloc.get_traced_memory()
+    if frames:
+        frames[-1][1] = max(frames[-1][1], peak)
+    tracemalloc.reset_peak()
+    frames.append([current, 0])
+
+
+def _memory_exit():
+    # Returns (absolute traced peak, peak above entry, retained since entry).
+    import tracemalloc
+    frames = _current.memory_frames
+    current, peak = tracemalloc.get_traced_memory()
+    start, child_peak = frames.pop()
+    peak = max(peak, child_peak)
+    if frames:
+        frames[-1][1] = max(frames[-1][1], peak)
+    return peak, peak - start, current - start
+
+
+def top_allocation_sites(snapshot, baseline, limit=MEMORY_TOP_SITES):
+    # Lines whose allocations grew the most since baseline, leaving out the
+    # profiler's own bookkeeping.
+    import tracemalloc
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+              tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+    stats = snapshot.filter_traces(ignore).compare_to(baseline.filter_traces(ignore), 'lineno')
+    sites = []
+    for stat in stats:
+        if stat.size_diff <= 0:
+            continue
+        frame = stat.traceback[0]
+        sites.append({"site": f"{frame.filename}:{frame.lineno}", "size_bytes": stat.size_diff, "count": stat.count_diff})
+        if len(sites) == limit:
+            break
+    return sites
+
+
+if os.environ.get(MEMORY_PROFILE_ENV, "").lower() in ("1", "true", "yes", "on"):
+    enable_memory_profiling()
+
+
+class RunMetrics:
+    # Wall/CPU time per stage and counters for one run (a Generate, an update
+    # check). Stages that repeat are summed; depth records nesting so the
+    # summary line can stick to the outermost stages.
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self.started = time.time()
+        self.wall_ms = 0.0
+        self.cpu_ms = 0.0
+        self.stages = {}
+        self.counters = {}
+        self.memory = None
+
+    def add_stage(self, name, depth, wall_ms, cpu_ms, memory=None):
+        entry = self.stages.get(name)
+        if entry is None:
+            entry = self.stages[name] = {"depth": depth, "calls": 0, "wall_ms": 0.0, "cpu_ms": 0.0}
+        entry["calls"] += 1
+        entry["wall_ms"] += wall_ms
+        entry["cpu_ms"] += cpu_ms
+        if memory:
+            traced_peak, peak, retained = memory
+            entry["peak_bytes"] = max(entry.get("peak_bytes", 0), peak)
+            entry["traced_peak_bytes"] = max(entry.get("traced_peak_bytes", 0), traced_peak)
+            entry["retained_bytes"] = entry.get("retained_bytes", 0) + retained
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def as_dict(self):
+        metrics = {
+            "run": self.name,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "fields": self.fields,
+            "wall_ms": round(self.wall_ms, 3),
+            "cpu_ms": round(self.cpu_ms, 3),
+            "stages": {name: {key: round(value, 3) if isinstance(value, float) else value for key, value in entry.items()}
+                       for name, entry in self.stages.items()},
+            "counters": self.counters,
+        }
+        if self.memory:
+            metrics["memory"] = self.memory
+        return metrics
+
+    def summary(self):
+        # e.g. "0.41 s: parse 120 ms, render 280 ms | 3,012 lines parsed, 45 runs rewritten"
+        stages = ", ".join(f"{name} {entry['wall_ms']:.0f} ms" for name, entry in self.stages.items() if entry["depth"] == 0)
+        counters = ", ".join(f"{value:,} {name.replace('_', ' ')}" for name, value in self.counters.items())
+        text = f"{self.wall_ms / 1000:.2f} s" + (f": {stages}" if stages else "")
+        if counters:
+            text += f" | {counters}"
+        if self.memory:
+            text += f" | peak {self.memory['peak_bytes'] / 1048576:.1f} MB, retained {self.memory['retained_bytes'] / 1048576:.1f} MB"
+        return text
+
+
+def metrics_dir():
+    directory = os.environ.get(METRICS_DIR_ENV)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        return directory
+    # Imported here: cache.py records its own counters through this module.
+    from cache import app_data_dir
+    return app_data_dir("metrics")
+
+
+def write_metrics(run):
+    # Never lets a metrics problem fail the run it describes.
+    try:
+        directory = metrics_dir()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(run.started))
+        path = os.path.join(directory, f"{stamp}-{int(run.started * 1000) % 1000:03d}-{run.name}.json")
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(run.as_dict(), f, indent=2)
+        os.replace(temp_path, path)
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+        for name in names[:-METRICS_KEEP]:
+            os.remove(os.path.join(directory, name))
+        return path
+    except OSError as e:
+        logging.warning("Failed to write metrics for %s: %s", run.name, e)
+        return None
+
+
+@contextmanager
+def metrics_run(name, write=True, **fields):
+    # Collects every stage and counter on this thread into a RunMetrics and,
+    # with write, saves it as one JSON file in the metrics directory.
+    run = RunMetrics(name, **fields)
+    previous = getattr(_current, "run", None)
+    previous_depth = getattr(_current, "depth", 0)
+    _current.run, _current.depth = run, 0
+    profiling = _memory_profile and _memory_lock.acquire(blocking=False)
+    if _memory_profile and not profiling:
+        logging.debug("Skipping memory profile of %s: another thread is being profiled", name)
+    if profiling:
+        import tracemalloc
+        baseline = tracemalloc.take_snapshot()
+        _memory_enter()
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield run
+    finally:
+        run.wall_ms = (time.perf_counter() - start) * 1000
+        run.cpu_ms = (time.thread_time() - cpu_start) * 1000
+        if profiling:
+            try:
+                traced_peak, peak, retained = _memory_exit()
+                run.memory = {"traced_peak_bytes": traced_peak, "peak_bytes": peak, "retained_bytes": retained,
+                              "top_sites": top_allocation_sites(tracemalloc.take_snapshot(), baseline)}
+            finally:
+                _memory_lock.release()
+        _current.run, _current.depth = previous, previous_depth
+        if write:
+            path = write_metrics(run)
+            if path:
+                logging.debug("Metrics for %s written to %s", name, path)
+
+
+def count(name, amount=1):
+    run = getattr(_current, "run", None)
+    if run is not None:
+        run.count(name, amount)
+
+
+@contextmanager
+def stage(name, **fields):
+    # Records wall and CPU time into the current run, and with stage timing
+    # on logs one structured line per stage (stage=parse elapsed_ms=12.34
+    # file=...) instead of per-line chatter. Costs nothing when neither is on.
+    run = getattr(_current, "run", None)
+    if run is None and not _stage_timing:
+        yield
+        return
+    depth = getattr(_current, "depth", 0)
+    _current.depth = depth + 1
+    # Only stages inside this thread's profiled run, which holds the lock.
+    profiling = _memory_profile and bool(getattr(_current, "memory_frames", None))
+    if profiling:
+        _memory_enter()
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        cpu_ms = (time.thread_time() - cpu_start) * 1000
+        memory = _memory_exit() if profiling else None
+        _current.depth = depth
+        if run is not None:
+            run.add_stage(name, depth, elapsed_ms, cpu_ms, memory)
+        if _stage_timing:
+            memory_fields = f" peak_kb={memory[1] / 1024:.1f} retained_kb={memory[2] / 1024:.1f}" if memory else ""
+            timing_logger.info("stage=%s elapsed_ms=%.2f cpu_ms=%.2f%s%s", name, elapsed_ms, cpu_ms, memory_fields,
+                               "".join(f" {key}={value}" for key, value in fields.items()))
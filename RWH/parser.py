@@ -1,8 +1,229 @@
 # parser.py
+import io
+import os
 import re
+import sys
+import json
+import codecs
+import hashlib
 import logging
+from collections import namedtuple
+from dataclasses import dataclass, asdict
+from instrumentation import count, stage
 import chardet
 
+# Bump when parse_txt_file's output changes shape; cached parse results are
+# keyed on it (together with a hash of this file and PARSER_FINGERPRINT).
+PARSER_VERSION = "2.0.0"
+
+# Encoding detection only looks at this much of the report, so memory use
+# stays flat no matter how large the HWINFO log is.
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+VIDEO_CHIPSET_PREFIX = re.compile(r'^Video Chipset:\s*')
+OPERATING_SYSTEM_PREFIX = re.compile(r'^Operating System:\s*')
+DDR_SPEED_PATTERN = re.compile(r'DDR\d+-\d+')
+# Panel model fragments to screen sizes, checked in order ("156" before "15").
+SCREEN_SIZES = [('17', '17"'), ('156', '15.6"'), ('154', '15.4"'), ('14', '14"'), ('13', '13"'), ('12', '12"')]
+
+BOM_ENCODINGS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+RESOLUTION_PATTERN = re.compile(r'(\d+\s*x\s*\d+)')
+DRIVE_SIZE_PATTERN = re.compile(r'(\d+)\s*(GB|TB)', re.IGNORECASE)
+LINK_SPEED_PATTERN = re.compile(r'\d+\s*Mbps')
+
+ASSETS_DIR_ENV = "RWH_ASSETS_DIR"
+WEBCAM_IDS_FILE = "webcam_ids.txt"
+WEBCAM_ID_PATTERN = re.compile(r'VID_([0-9A-F]{4})&PID_([0-9A-F]{4})', re.IGNORECASE)
+
+def find_data_file(name):
+    # The parser may run from the source tree, the PyInstaller bundle's assets
+    # folder or module_cache after an update, so look in each of those.
+    # RWH_ASSETS_DIR, when set, is searched first (the benchmark uses it for
+    # parsers loaded from a release folder).
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    candidates = [os.path.join(module_dir, name), os.path.join(module_dir, "assets", name)]
+    if os.environ.get(ASSETS_DIR_ENV):
+        candidates.insert(0, os.path.join(os.environ[ASSETS_DIR_ENV], name))
+    if getattr(sys, 'frozen', False):
+        candidates.append(os.path.join(sys._MEIPASS, "assets", name))
+    candidates.append(os.path.join(os.getcwd(), "assets", name))
+    return next((path for path in candidates if os.path.exists(path)), None)
+
+def normalize_webcam_id(vid, pid):
+    # Letter O typed for zero has crept into hand-maintained lists before.
+    return f"VID_{vid.upper().replace('O', '0')}&PID_{pid.upper().replace('O', '0')}"
+
+def load_webcam_ids():
+    path = find_data_file(WEBCAM_IDS_FILE)
+    if path is None:
+        logging.error("Webcam ID list %s not found; only 'camera' lines will be detected", WEBCAM_IDS_FILE)
+        return frozenset()
+    webcam_ids = set()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            entry = line.split('#', 1)[0].strip()
+            match = re.fullmatch(r'VID_(\w{4})&PID_(\w{4})', entry, re.IGNORECASE)
+            if match:
+                webcam_ids.add(normalize_webcam_id(match.group(1), match.group(2)))
+            elif entry:
+                logging.warning("Ignoring malformed webcam ID in %s: %s", path, entry)
+    logging.debug("Loaded %s webcam IDs from %s", len(webcam_ids), path)
+    return frozenset(webcam_ids)
+
+WEBCAM_IDS = load_webcam_ids()
+
+def find_webcam_id(line):
+    for match in WEBCAM_ID_PATTERN.finditer(line):
+        webcam_id = normalize_webcam_id(match.group(1), match.group(2))
+        if webcam_id in WEBCAM_IDS:
+            return webcam_id
+    return None
+
+FIELD_MAP_FILE = "field_map.json"
+
+# Value filters take the value and the whole line and return what to store,
+# or None to skip the line.
+def min_drive_size(value, line):
+    size_match = DRIVE_SIZE_PATTERN.search(value)
+    if not size_match:
+        return None
+    size = int(size_match.group(1))
+    if size_match.group(2).upper() == "TB":
+        size *= 1000  # Convert TB to GB
+    return value if size >= 128 else None  # Only include drives >= 128GB
+
+def wifi_only(value, line):
+    lowered = value.lower()
+    return value if "wi-fi" in lowered and "ethernet" not in lowered else None
+
+def wifi_link_speed(value, line):
+    if "wi-fi" not in line.lower():
+        return None
+    speed_match = LINK_SPEED_PATTERN.search(value)
+    return speed_match.group(0) if speed_match else None
+
+VALUE_FILTERS = {
+    "min_drive_size": min_drive_size,
+    "wifi_only": wifi_only,
+    "wifi_link_speed": wifi_link_speed,
+}
+
+# HWINFO key -> where its value goes. "section" stores into that section of
+# the parsed data; "fallback" stores into keyname_fallback, either "set" (last
+# value wins) or "append" (collect every value). Extra or replacement entries
+# in the same shape can be supplied in field_map.json under "fields".
+FIELD_MAP = {
+    "Computer Brand Name": {"section": "System"},
+    "Product Serial Number": {"section": "System"},
+    "SKU Number": {"section": "System"},
+    "CPU Brand Name": {"section": "Processor"},
+    "Total Memory Size": {"section": "Memory"},
+    "Memory Speed": {"section": "Memory"},
+    "Drive Model": {"section": "Drive", "filter": "min_drive_size"},
+    "Network Card": {"section": "Network", "filter": "wifi_only"},
+    "Monitor Name (Manuf)": {"section": "Monitor"},
+    "Audio Adapter": {"section": "Audio"},
+    "Wear Level": {"section": "Battery"},
+    "BIOS Version": {"section": "BIOS"},
+    "UEFI Boot": {"section": "BIOS"},
+    "Video Chipset": {"fallback": "append"},
+    "Operating System": {"fallback": "set"},
+    "Maximum Link Speed": {"fallback": "append", "filter": "wifi_link_speed"},
+}
+
+FieldRule = namedtuple('FieldRule', ['section', 'fallback', 'value_filter'])
+
+def compile_field_rules(field_map):
+    rules = {}
+    for key, spec in field_map.items():
+        filter_name = spec.get("filter")
+        if filter_name and filter_name not in VALUE_FILTERS:
+            logging.warning("Ignoring field %s: unknown filter %s", key, filter_name)
+            continue
+        if not spec.get("section") and spec.get("fallback") not in ("set", "append"):
+            logging.warning("Ignoring field %s: needs a section or a fallback of 'set'/'append'", key)
+            continue
+        rules[key] = FieldRule(spec.get("section"), spec.get("fallback"), VALUE_FILTERS.get(filter_name))
+    return rules
+
+def load_field_rules():
+    field_map = dict(FIELD_MAP)
+    path = find_data_file(FIELD_MAP_FILE)
+    if path:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                field_map.update(json.load(f).get("fields", {}))
+            logging.debug("Loaded field map overrides from %s", path)
+        except (OSError, ValueError) as e:
+            logging.error("Failed to load field map %s: %s", path, e)
+    return compile_field_rules(field_map)
+
+FIELD_RULES = load_field_rules()
+
+def parser_fingerprint():
+    # webcam_ids.txt and field_map.json change what the parser returns without
+    # touching this file, so the cache key includes what was loaded from them.
+    rules = sorted((key, rule.section, rule.fallback, rule.value_filter.__name__ if rule.value_filter else None)
+                   for key, rule in FIELD_RULES.items())
+    payload = json.dumps([sorted(WEBCAM_IDS), rules])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
+
+PARSER_FINGERPRINT = parser_fingerprint()
+
+def store_field(rule, key, value, line, sections, keyname_fallback):
+    if rule.value_filter:
+        value = rule.value_filter(value, line)
+        if value is None:
+            return None
+    if rule.section:
+        sections.setdefault(rule.section, {})[key] = value
+    elif rule.fallback == "append":
+        keyname_fallback.setdefault(key, []).append(value)
+    else:
+        keyname_fallback[key] = value
+    return value
+
+def detect_encoding(sample, complete=False):
+    # HWINFO writes UTF-16LE with a BOM or plain UTF-8/ASCII, so try the cheap
+    # tiers first and only hand the sample to chardet when both fail. Returns
+    # the encoding and the tier that decided it.
+    for bom, encoding in BOM_ENCODINGS:
+        if sample.startswith(bom):
+            return encoding, 'bom'
+    # NUL bytes are valid UTF-8 but never appear in a text report; they mean
+    # BOM-less UTF-16/32, which chardet has to sort out.
+    if b'\x00' not in sample:
+        try:
+            # A sample cut mid-character is fine unless it is the whole file.
+            codecs.getincrementaldecoder('utf-8')(errors='strict').decode(sample, final=complete)
+            return 'utf-8', 'utf-8'
+        except UnicodeDecodeError:
+            pass
+    return chardet.detect(sample)['encoding'] or 'utf-8', 'chardet'
+
+def open_report(file_path):
+    # One handle serves both detection and parsing: sniff a bounded prefix,
+    # rewind, and decode lazily line by line.
+    raw = open(file_path, 'rb')
+    try:
+        with stage("parse.detect_encoding", file=os.path.basename(file_path)):
+            sample = raw.read(ENCODING_SAMPLE_SIZE)
+            encoding, tier = detect_encoding(sample, complete=len(sample) < ENCODING_SAMPLE_SIZE)
+        logging.debug("Encoding detection: tier=%s encoding=%s file=%s", tier, encoding, file_path)
+        raw.seek(0)
+        return io.TextIOWrapper(raw, encoding=encoding, errors='replace'), encoding
+    except Exception:
+        raw.close()
+        raise
+
 def parse_txt_file(file_path):
     data = {}
     camera_found = False
@@ -20,138 +241,179 @@ def parse_txt_file(file_path):
     }
     pending_subsection_value = None
     keyname_fallback = {"Video Chipset": [], "Maximum Link Speed": []}
-    
-    # List of common VID/PID for laptop webcams
-    webcam_vid_pid = [
-        "VID_0BDA&PID_5520", "VID_1BCF&PID_2B95", "VID_04F2&PID_B5A7", "VID_322E&PID_2025",
-        "VID_5986&PID_118A", "VID_0C45&PID_60B0", "VID_04F2&PID_B61E", "VID_0BDA&PID_5852",
-        "VID_0BDA&PID_5846", "VID_0C45&PID_6513", "VID_0408&PID_5489", "VID_04F2&PID_B578",
-        "VID_0BDA&PID_57F8", "VID_0C45&PID_6366", "VID_13D3&PID_56A2", "VID_058F&PID_5608",
-        "VID_0408&PID_A031", "VID_0AC8&PID_307B", "VID_0553&PID_0100", "VID_0C45&PID_62C0",
-        "VID_1BCF&PID_2C99", "VID_0BDA&PID_58F4", "VID_04F2&PID_B6BF", "VID_0C45&PID_6A06",
-        "VID_5986&PID_9102", "VID_0BDA&PID_58F0", "VID_0C45&PID_64AB", "VID_322E&PID_2501",
-        "VID_0BDA&PID_58F2", "VID_OC45&PID_63F9", "VID_OC45&PID_63F8", "VID_OC45&PID_63E9",
-        "VID_13D3&PID_5671", "VID_13D3&PID_5675", "VID_13D3&PID_5657", "VID_13D3&PID_5659",
-        "VID_13D3&PID_5661", "VID_13D3&PID_5701", "VID_13D3&PID_5702", "VID_13D3&PID_5659",
-        "VID_0BDA&PID_5520", "VID_1BCF&PID_2B95", "VID_04F2&PID_B5A7", "VID_322E&PID_2025",
-        "VID_13D3&PID_5666", "VID_13D3&PID_5671", "VID_13D3&PID_5675", "VID_13D3&PID_5657",
-        "VID_13D3&PID_5659", "VID_13D3&PID_5661", "VID_13D3&PID_5701", "VID_13D3&PID_5702",
-        "VID_04F2&PID_0113", "VID_04F2&PID_100D", "VID_04F2&PID_100F", "VID_0C45&PID_63E9",
-        "VID_0C45&PID_63F8", "VID_0C45&PID_63F9", "VID_046D&PID_0825", "VID_413C&PID_81E0"
-    ]
 
     try:
-        with open(file_path, 'rb') as file:
-            raw_data = file.read()
-            result = chardet.detect(raw_data)
-            encoding = result['encoding']
-        with open(file_path, 'r', encoding=encoding, errors='replace') as file:
-            lines = file.readlines()
+        report, encoding = open_report(file_path)
     except Exception as e:
-        logging.error(f"Failed to read file {file_path}: {str(e)}")
+        logging.error("Failed to read file %s: %s", file_path, e)
         return data, camera_found, keyname_fallback
 
-    logging.debug(f"Processing {len(lines)} lines from {file_path} with encoding {encoding}")
+    logging.debug("Processing %s with encoding %s", file_path, encoding)
+    # Checked once per report; per-line messages are only built when someone reads them.
+    debug = logging.getLogger().isEnabledFor(logging.DEBUG)
 
-    for i, line in enumerate(lines):
-        line = re.sub(r'\t+', ' ', line)
-        line = re.sub(r'\s+', ' ', line).strip()
-        if not line:
-            logging.debug(f"Line {i+1}: Skipped (empty)")
-            continue
+    line_count = 0
+    with report, stage("parse.lines", file=os.path.basename(file_path)):
+        for i, line in enumerate(report):
+            line_count += 1
+            line = WHITESPACE_PATTERN.sub(' ', line).strip()
+            if not line:
+                if debug:
+                    logging.debug("Line %d: Skipped (empty)", i + 1)
+                continue
 
-        # Check for camera in line or VID/PID
-        if 'camera' in line.lower() or any(vid_pid in line for vid_pid in webcam_vid_pid):
-            camera_key = 'Camera' if 'camera' in line.lower() else 'Webcam VID/PID'
-            camera_value = line if 'camera' in line.lower() else next((vid_pid for vid_pid in webcam_vid_pid if vid_pid in line), 'Unknown')
-            camera_found = True
-            logging.debug(f"Line {i+1}: {camera_key} detected: {camera_value}")
+            # Check for camera in line or VID/PID
+            if 'camera' in line.lower():
+                camera_found = True
+                if debug:
+                    logging.debug("Line %d: Camera detected: %s", i + 1, line)
+            else:
+                webcam_id = find_webcam_id(line)
+                if webcam_id:
+                    camera_found = True
+                    if debug:
+                        logging.debug("Line %d: Webcam VID/PID detected: %s", i + 1, webcam_id)
 
-        if line.startswith('[') and line.endswith(']') and line != '[General Information]':
-            pending_subsection_value = line.strip('[]')
-            logging.debug(f"Line {i+1}: Found subsection: {pending_subsection_value}")
-            continue
-        elif pending_subsection_value:
-            if 'Supported Video Modes' in pending_subsection_value:
-                resolution_match = re.match(r'(\d+\s*x\s*\d+)', line)
-                if resolution_match:
-                    resolution = resolution_match.group(1).strip()
-                    sections["Monitor"]["Supported Video Modes"] = resolution
-                    logging.debug(f"Line {i+1}: Stored subsection value: {pending_subsection_value} = {resolution}")
-                else:
-                    logging.debug(f"Line {i+1}: Could not extract resolution from: {line}")
-            elif line:
-                keyname_fallback[pending_subsection_value] = line
-                logging.debug(f"Line {i+1}: Stored subsection value: {pending_subsection_value} = {line}")
-            pending_subsection_value = None
-            continue
-        if ':' in line:
-            try:
-                key, value = map(str.strip, line.split(':', 1))
-                if not key or not value:
-                    logging.debug(f"Line {i+1}: Skipped (invalid key-value pair: {line})")
-                    continue
-
-                logging.debug(f"Line {i+1}: Found key-value pair: {key} = {value}")
-
-                if key == "Computer Brand Name":
-                    sections["System"][key] = value
-                elif key == "Product Serial Number":
-                    sections["System"][key] = value
-                elif key == "SKU Number":
-                    sections["System"][key] = value
-                elif key == "CPU Brand Name":
-                    sections["Processor"][key] = value
-                elif key == "Total Memory Size":
-                    sections["Memory"][key] = value
-                elif key == "Memory Speed":
-                    sections["Memory"][key] = value
-                elif key == "Drive Model":
-                    # Extract drive size from value
-                    size_match = re.search(r'(\d+)\s*(GB|TB)', value, re.IGNORECASE)
-                    if size_match:
-                        size = int(size_match.group(1))
-                        unit = size_match.group(2).upper()
-                        if unit == "TB":
-                            size *= 1000  # Convert TB to GB
-                        if size >= 128:  # Only include drives >= 128GB
-                            sections["Drive"][key] = value
-                        else:
-                            logging.debug(f"Line {i+1}: Skipped drive size {size}GB (below 128GB)")
-                    else:
-                        logging.debug(f"Line {i+1}: No valid drive size found in: {value}")
-                elif key == "Network Card" and "wi-fi" in value.lower() and "ethernet" not in value.lower():
-                    sections["Network"][key] = value
-                elif key == "Monitor Name (Manuf)":
-                    sections["Monitor"][key] = value
-                elif key == "Audio Adapter":
-                    sections["Audio"][key] = value
-                elif key == "Wear Level":
-                    sections["Battery"][key] = value
-                elif key in ["BIOS Version", "UEFI Boot"]:
-                    sections["BIOS"][key] = value
-
-                if key == "Video Chipset" and "Codename" not in key:
-                    keyname_fallback["Video Chipset"].append(value)
-                    logging.debug(f"Line {i+1}: Stored in fallback: {key} = {value}")
-                elif key == "Operating System":
-                    keyname_fallback[key] = value
-                    logging.debug(f"Line {i+1}: Stored in fallback: {key} = {value}")
-                elif key == "Maximum Link Speed" and "wi-fi" in line.lower():
-                    speed_match = re.search(r'\d+\s*Mbps', value)
-                    if speed_match:
-                        keyname_fallback["Maximum Link Speed"].append(speed_match.group(0))
-                        logging.debug(f"Line {i+1}: Stored in fallback: {key} = {speed_match.group(0)}")
-            except ValueError:
-                logging.debug(f"Line {i+1}: Skipped (malformed line: {line})")
+            if line.startswith('[') and line.endswith(']') and line != '[General Information]':
+                pending_subsection_value = line.strip('[]')
+                if debug:
+                    logging.debug("Line %d: Found subsection: %s", i + 1, pending_subsection_value)
                 continue
-        else:
-            logging.debug(f"Line {i+1}: Skipped (no colon: {line})")
+            elif pending_subsection_value:
+                if 'Supported Video Modes' in pending_subsection_value:
+                    resolution_match = RESOLUTION_PATTERN.match(line)
+                    if resolution_match:
+                        resolution = resolution_match.group(1).strip()
+                        sections["Monitor"]["Supported Video Modes"] = resolution
+                        if debug:
+                            logging.debug("Line %d: Stored subsection value: %s = %s", i + 1, pending_subsection_value, resolution)
+                    elif debug:
+                        logging.debug("Line %d: Could not extract resolution from: %s", i + 1, line)
+                elif line:
+                    keyname_fallback[pending_subsection_value] = line
+                    if debug:
+                        logging.debug("Line %d: Stored subsection value: %s = %s", i + 1, pending_subsection_value, line)
+                pending_subsection_value = None
+                continue
+            if ':' not in line:
+                if debug:
+                    logging.debug("Line %d: Skipped (no colon: %s)", i + 1, line)
+                continue
+
+            key, value = line.split(':', 1)
+            rule = FIELD_RULES.get(key.strip())
+            if rule is None:
+                continue
+            key, value = key.strip(), value.strip()
+            if not value:
+                if debug:
+                    logging.debug("Line %d: Skipped (invalid key-value pair: %s)", i + 1, line)
+                continue
+
+            if debug:
+                logging.debug("Line %d: Found key-value pair: %s = %s", i + 1, key, value)
+            stored = store_field(rule, key, value, line, sections, keyname_fallback)
+            if debug:
+                if stored is None:
+                    logging.debug("Line %d: Skipped %s (filtered out: %s)", i + 1, key, value)
+                else:
+                    logging.debug("Line %d: Stored %s = %s", i + 1, key, stored)
+
+    count("lines_parsed", line_count)
+    logging.debug("Processed %s lines from %s", line_count, file_path)
 
     for section_name, section_data in sections.items():
         if section_data:
             data[section_name] = section_data
 
-    logging.debug(f"Parsed section data: {data}")
-    logging.debug(f"Parsed fallback data: {keyname_fallback}")
-    return data, camera_found, keyname_fallback
\ No newline at end of file
+    logging.debug("Parsed section data: %s", data)
+    logging.debug("Parsed fallback data: %s", keyname_fallback)
+    return data, camera_found, keyname_fallback
+
+@dataclass
+class HardwareProfile:
+    # Everything the worksheet and the output file name need from one report,
+    # derived once from the parse result. Missing brand/serial/SKU are None;
+    # the rest are ready to print, with "N/A" where HWINFO had nothing.
+    __slots__ = ('brand_name', 'serial_number', 'sku_number', 'cpu', 'memory', 'drive_model', 'network',
+                 'screen_size', 'resolution', 'video_chipsets', 'audio_adapter', 'operating_system',
+                 'battery', 'camera_found')
+    brand_name: str
+    serial_number: str
+    sku_number: str
+    cpu: str
+    memory: str
+    drive_model: str
+    network: str
+    screen_size: str
+    resolution: str
+    video_chipsets: str
+    audio_adapter: str
+    operating_system: str
+    battery: str
+    camera_found: bool
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def screen_size_for(monitor_name):
+    if not monitor_name:
+        return ""
+    monitor_name = monitor_name.lower()
+    return next((size for fragment, size in SCREEN_SIZES if fragment in monitor_name), "Unknown")
+
+
+def build_hardware_profile(data, camera_found, keyname_fallback):
+    # One pass over the sections; the first section holding a key wins, as
+    # the per-field scans used to. The SKU comes from the section with the
+    # serial number, or System.
+    fields = {}
+    serial_section = "System"
+    for section_name, section_data in data.items():
+        if 'Product Serial Number' in section_data and 'Product Serial Number' not in fields:
+            serial_section = section_name
+        for key, value in section_data.items():
+            fields.setdefault(key, value)
+    sku_number = data.get(serial_section, {}).get('SKU Number')
+
+    battery = "No"
+    wear_level = fields.get('Wear Level')
+    if wear_level:
+        battery = f"Yes, {100 - float(wear_level.replace('%', '')):.1f}% remaining health"
+
+    memory = "N/A"
+    memory_size = data.get("Memory", {}).get('Total Memory Size', '')
+    memory_speed = data.get("Memory", {}).get('Memory Speed', '')
+    if memory_size and memory_speed:
+        ddr_match = DDR_SPEED_PATTERN.search(memory_speed)
+        memory = f"{memory_size} {ddr_match.group(0)}MHz" if ddr_match else f"{memory_size}MHz"
+    elif memory_size:
+        memory = f"{memory_size}MHz"
+
+    network = "N/A"
+    network_card = fields.get('Network Card', '')
+    if network_card:
+        link_speed = keyname_fallback.get("Maximum Link Speed", [])
+        network = f"{network_card} - {link_speed[0] if link_speed else '866 Mbps'}"
+
+    chipsets = [VIDEO_CHIPSET_PREFIX.sub('', chipset).strip() for chipset in keyname_fallback.get("Video Chipset", [])]
+
+    profile = HardwareProfile(
+        brand_name=fields.get('Computer Brand Name'),
+        serial_number=fields.get('Product Serial Number'),
+        sku_number=sku_number,
+        cpu=data.get('Processor', {}).get('CPU Brand Name', 'N/A'),
+        memory=memory,
+        drive_model=fields.get('Drive Model') or 'N/A',
+        network=network,
+        screen_size=screen_size_for(fields.get('Monitor Name (Manuf)')),
+        resolution=fields.get('Supported Video Modes', '').strip(),
+        video_chipsets=", ".join(chipsets) if chipsets else "N/A",
+        audio_adapter=fields.get('Audio Adapter', 'N/A'),
+        operating_system=OPERATING_SYSTEM_PREFIX.sub('', keyname_fallback.get("Operating System", "N/A")),
+        battery=battery,
+        camera_found=camera_found,
+    )
+    logging.debug("Hardware profile: %s", profile)
+    return profile
@@ -1,10 +0,0 @@
-import hashlib
-
-def calculate_sha256(file_path):
-    sha256 = hashlib.sha256()
-    with open(file_path, 'rb') as f:
-        while chunk := f.read(8192):
-            sha256.update(chunk)
-    return sha256.hexdigest()
-
-print(calculate_sha256('parser.py'))
\ No newline at end of file
@@ -1,10 +1,45 @@
+# sha256.py
+# Shared SHA-256 helper for the updater, parse cache and release tooling.
+#   python sha256.py parser.py template.py utils.py
+import argparse
 import hashlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 1024 * 1024
 
 def calculate_sha256(file_path):
     sha256 = hashlib.sha256()
     with open(file_path, 'rb') as f:
-        while chunk := f.read(8192):
+        while chunk := f.read(CHUNK_SIZE):
             sha256.update(chunk)
     return sha256.hexdigest()
 
-print(calculate_sha256('utils.py'))
\ No newline at end of file
+def hash_files(paths, workers=8):
+    # Reads over the share are I/O bound and hashlib releases the GIL on
+    # large chunks, so a thread pool overlaps both. Yields (path, sha256 or
+    # the OSError raised for it) in input order.
+    def safe_hash(path):
+        try:
+            return calculate_sha256(path)
+        except OSError as e:
+            return e
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths)))) as executor:
+        yield from zip(paths, executor.map(safe_hash, paths))
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Print the SHA-256 of each file.")
+    arg_parser.add_argument("paths", nargs="+", help="Files to hash")
+    arg_parser.add_argument("-j", "--jobs", type=int, default=8, help="Files hashed in parallel")
+    args = arg_parser.parse_args(argv)
+    status = 0
+    for path, result in hash_files(args.paths, args.jobs):
+        if isinstance(result, OSError):
+            print(f"{path}: {result.strerror}", file=sys.stderr)
+            status = 1
+        else:
+            print(f"{result}  {path}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
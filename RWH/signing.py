@@ -0,0 +1,71 @@
+# signing.py
+# Ed25519 signatures over versions.json. hashupdate.py signs with the release
+# key; updater.py verifies with the public key built into the executable.
+# versions.json carries the SHA-256 of every module and of the bundle, so one
+# signature covers every download.
+#   python signing.py generate-key release_key.txt
+import json
+import sys
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+
+SIGNATURE_FIELD = "signature"
+
+
+def signed_payload(versions):
+    # Canonical bytes of everything but the signature, so re-indenting the
+    # file or the updater's cached copy of it does not break verification.
+    content = {key: value for key, value in versions.items() if key != SIGNATURE_FIELD}
+    return json.dumps(content, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def load_private_key(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return Ed25519PrivateKey.from_private_bytes(bytes.fromhex(f.read().strip()))
+
+
+def public_key_hex(private_key):
+    return private_key.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw).hex()
+
+
+def sign_versions(versions, private_key):
+    return dict(versions, **{SIGNATURE_FIELD: private_key.sign(signed_payload(versions)).hex()})
+
+
+def verify_versions(versions, public_key):
+    signature = versions.get(SIGNATURE_FIELD)
+    if not public_key or not isinstance(signature, str):
+        return False
+    try:
+        Ed25519PublicKey.from_public_bytes(bytes.fromhex(public_key)).verify(bytes.fromhex(signature), signed_payload(versions))
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+
+def generate_key(path):
+    private_key = Ed25519PrivateKey.generate()
+    raw = private_key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw, serialization.NoEncryption())
+    with open(path, 'x', encoding='utf-8') as f:
+        f.write(raw.hex())
+    return public_key_hex(private_key)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2 or argv[0] != "generate-key":
+        print("Usage: python signing.py generate-key PRIVATE_KEY_FILE")
+        return 1
+    try:
+        public_key = generate_key(argv[1])
+    except FileExistsError:
+        print(f"{argv[1]} already exists; not overwriting a signing key")
+        return 1
+    print(f"Private key written to {argv[1]}; keep it with the release tool only.")
+    print(f"Set UPDATE_PUBLIC_KEY in updater.py to:\n{public_key}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+# startup_bench.py
+# Measures how long core.py takes to import (and optionally to show its
+# window) in fresh interpreters, with a -X importtime breakdown of the
+# slowest imports. --assets compares preparing the window images with a cold
+# image cache (resampled with PIL, as every start used to) against a warm one.
+#   python startup_bench.py [--runs 5] [--top 15] [--window] [--assets]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Modules that should stay out of startup; see load_generation_modules in core.py.
+DEFERRED_MODULES = ["PIL", "docx", "lxml", "chardet", "requests", "win32gui", "win32con", "parser", "template", "utils", "updater"]
+
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import core
+elapsed = time.perf_counter() - start
+if {window}:
+    app = core.AssetFormFiller()
+    app.update()
+    elapsed = time.perf_counter() - start
+    app.destroy()
+print(elapsed)
+print(",".join(name for name in {deferred!r} if name in sys.modules))
+"""
+
+ASSETS_SCRIPT = """
+import os, time
+import core
+from cache import cached_image
+start = time.perf_counter()
+for file_name, width, height, fit in core.IMAGE_ASSETS.values():
+    cached_image(os.path.join("assets", file_name), width, height, fit)
+print(time.perf_counter() - start)
+"""
+
+def run_script(command, env=None):
+    result = subprocess.run(command, capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise SystemExit(f"core.py failed to start:\n{result.stderr}")
+    return result
+
+def run_once(window, importtime):
+    script = IMPORT_SCRIPT.format(window=window, deferred=DEFERRED_MODULES)
+    result = run_script([sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", script])
+    elapsed, loaded = result.stdout.splitlines()[-2:]
+    return float(elapsed), [name for name in loaded.split(",") if name], result.stderr
+
+def bench_assets(runs):
+    # Each cold run gets an empty cache directory; the warm runs reuse one
+    # that the first of them fills.
+    def timed(cache_dir):
+        env = dict(os.environ, RWH_IMAGE_CACHE_DIR=cache_dir)
+        return float(run_script([sys.executable, "-c", ASSETS_SCRIPT], env).stdout.splitlines()[-1])
+    cold = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(timed(cache_dir))
+    with tempfile.TemporaryDirectory() as cache_dir:
+        timed(cache_dir)
+        warm = [timed(cache_dir) for _ in range(runs)]
+    print(f"window images, cold cache (PIL resize): median {statistics.median(cold) * 1000:.1f} ms")
+    print(f"window images, warm cache:              median {statistics.median(warm) * 1000:.1f} ms")
+
+def parse_importtime(stderr):
+    # Lines look like "import time:  self [us] | cumulative | imported package",
+    # with nesting shown by indentation of the package name.
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return imports
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark RefurbHelper cold start.")
+    arg_parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    arg_parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+    arg_parser.add_argument("--window", action="store_true", help="Also build and paint the main window (needs a display)")
+    arg_parser.add_argument("--assets", action="store_true", help="Compare window image preparation with a cold and a warm image cache")
+    args = arg_parser.parse_args()
+
+    if args.assets:
+        bench_assets(args.runs)
+        print()
+
+    timings = []
+    for _ in range(args.runs):
+        elapsed, loaded, _ = run_once(args.window, importtime=False)
+        timings.append(elapsed)
+    _, loaded, stderr = run_once(args.window, importtime=True)
+
+    what = "import + first paint" if args.window else "import core"
+    print(f"{what}: median {statistics.median(timings) * 1000:.1f} ms, "
+          f"min {min(timings) * 1000:.1f} ms over {args.runs} runs")
+    print("\nSlowest imports (-X importtime, cumulative):")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative_us, self_us, name in sorted(parse_importtime(stderr), reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {name}")
+    if loaded:
+        print(f"\nWARNING: loaded at startup but meant to be deferred: {', '.join(loaded)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
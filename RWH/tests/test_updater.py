@@ -0,0 +1,122 @@
+# test_updater.py
+import dataclasses
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+RWH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RWH_DIR)
+
+import updater
+from docx import Document
+from parser import HardwareProfile
+from sha256 import calculate_sha256
+from signing import public_key_hex, sign_versions
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+FORM_DATA = {
+    'technician_initials': 'BM',
+    'warranty': False,
+    'warranty_date': '',
+    'power_adaptor': True,
+    'touchscreen': False,
+    'ports': 'HDMI',
+    'condition': 'Good'
+}
+
+# Wraps the bundled process_element so its effect shows up in the worksheet.
+UTILS_PATCH = '''
+
+_bundled_process_element = process_element
+
+def process_element(element, replacements):
+    _bundled_process_element(element, {key: f"{value} (updated utils)" for key, value in replacements.items()})
+'''
+
+
+class ModuleCacheTestCase(unittest.TestCase):
+    # Points the updater at an empty module_cache in a temp directory.
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix="rwh-updater-test-")
+        self.saved_modules = {name: sys.modules.get(name) for name in ("utils", "parser", "template")}
+        self.saved_cache = updater.LOCAL_CACHE
+        updater.LOCAL_CACHE = os.path.join(self.work_dir, "module_cache")
+        os.makedirs(updater.LOCAL_CACHE)
+
+    def tearDown(self):
+        updater.LOCAL_CACHE = self.saved_cache
+        os.environ.pop(updater.UPDATE_SOURCES_ENV, None)
+        for name, module in self.saved_modules.items():
+            if module is None:
+                sys.modules.pop(name, None)
+            else:
+                sys.modules[name] = module
+        shutil.rmtree(self.work_dir)
+
+    def install(self, manifest, module_name, content, version):
+        path = os.path.join(updater.LOCAL_CACHE, module_name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        updater.record_installed(manifest, module_name, version, calculate_sha256(path))
+
+
+class UtilsOnlyUpdateTest(ModuleCacheTestCase):
+    def test_utils_only_update_reaches_rendering(self):
+        with open(os.path.join(RWH_DIR, "utils.py"), 'r', encoding='utf-8') as f:
+            utils_source = f.read()
+        manifest = {"modules": {}}
+        self.install(manifest, "utils.py", utils_source + UTILS_PATCH, "9.0.0")
+
+        updates = updater.load_cached_modules(manifest)
+
+        fill_template = updates["fill_template"]
+        self.assertIs(fill_template.__globals__["process_element"], updates["process_element"])
+        profile = HardwareProfile(**{field.name: "Value" for field in dataclasses.fields(HardwareProfile)})
+        output_path = os.path.join(self.work_dir, "worksheet.docx")
+        fill_template(os.path.join(RWH_DIR, "Template.docx"), output_path, profile, FORM_DATA)
+        text = "\n".join(cell.text for table in Document(output_path).tables for row in table.rows for cell in row.cells)
+        self.assertIn("(updated utils)", text)
+
+    def test_bundled_modules_are_not_reloaded_without_updates(self):
+        self.assertEqual(updater.load_cached_modules({"modules": {}}), {})
+
+
+class SignedVersionsTest(ModuleCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.release_key = Ed25519PrivateKey.generate()
+        self.saved_public_key = updater.UPDATE_PUBLIC_KEY
+        updater.UPDATE_PUBLIC_KEY = public_key_hex(self.release_key)
+        self.server_dir = os.path.join(self.work_dir, "server")
+        os.makedirs(self.server_dir)
+        os.environ[updater.UPDATE_SOURCES_ENV] = self.server_dir
+
+    def tearDown(self):
+        updater.UPDATE_PUBLIC_KEY = self.saved_public_key
+        super().tearDown()
+
+    def publish(self, signing_key):
+        utils_path = os.path.join(self.server_dir, "utils.py")
+        shutil.copy(os.path.join(RWH_DIR, "utils.py"), utils_path)
+        versions = {"modules": {"utils.py": {"version": "9.0.0", "sha256": calculate_sha256(utils_path), "path": "utils.py"}}}
+        with open(os.path.join(self.server_dir, "versions.json"), 'w', encoding='utf-8') as f:
+            json.dump(sign_versions(versions, signing_key), f)
+
+    def test_signed_versions_are_installed(self):
+        self.publish(self.release_key)
+        updates = updater.check_for_updates(force=True)
+        self.assertIn("process_element", updates)
+        self.assertIn("utils.py", updater.load_manifest()["modules"])
+
+    def test_versions_signed_by_another_key_are_rejected(self):
+        self.publish(Ed25519PrivateKey.generate())
+        self.assertEqual(updater.check_for_updates(force=True), {})
+        self.assertEqual(updater.load_manifest()["modules"], {})
+        self.assertFalse(os.path.exists(os.path.join(updater.LOCAL_CACHE, "utils.py")))
+
+
+if __name__ == "__main__":
+    unittest.main()
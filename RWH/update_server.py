@@ -0,0 +1,44 @@
+# update_server.py
+# Stand-in for the LAN update server: serves a folder holding versions.json
+# and the modules over plain HTTP so the updater can be exercised end to end.
+#   python update_server.py <release folder> --port 8000
+#   set RWH_UPDATE_SOURCES=http://localhost:8000/
+import argparse
+import functools
+import logging
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+class UpdateRequestHandler(SimpleHTTPRequestHandler):
+    # SimpleHTTPRequestHandler already answers If-Modified-Since with 304,
+    # which is all the updater's conditional requests need.
+    delay = 0.0
+
+    def send_head(self):
+        if self.delay:
+            time.sleep(self.delay)
+        return super().send_head()
+
+    def log_message(self, format, *args):
+        logging.info("%s %s", self.address_string(), format % args)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Serve a release folder to the RefurbHelper updater.")
+    arg_parser.add_argument("directory", nargs="?", default=".", help="Folder containing versions.json and the modules")
+    arg_parser.add_argument("--host", default="0.0.0.0")
+    arg_parser.add_argument("--port", type=int, default=8000)
+    arg_parser.add_argument("--delay", type=float, default=0.0, help="Seconds to stall each request, to mimic a slow link")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    UpdateRequestHandler.delay = args.delay
+    handler = functools.partial(UpdateRequestHandler, directory=args.directory)
+    with ThreadingHTTPServer((args.host, args.port), handler) as server:
+        logging.info("Serving %s on http://%s:%s/", args.directory, args.host, args.port)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,561 @@
+# updater.py
+import hashlib
+import importlib.util
+import marshal
+import os
+import sys
+import json
+import time
+import logging
+import socket
+import queue
+import threading
+import zipfile
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlsplit
+import requests
+from sha256 import calculate_sha256
+from signing import verify_versions
+from instrumentation import count, stage
+
+# Update configuration
+GITHUB_REPO = "https://api.github.com/repos/KyleJamesOlson/RefurbHelper/contents/RWH"
+LAN_SHARE = r"\\192.168.5.70\SE Stuff\RWH"
+# Where updates come from, in order of preference: the first reachable entry
+# is used, so every client follows the same release stream however quickly
+# each source answers. Each entry is the GitHub contents API URL, a plain
+# http(s) base URL serving versions.json and the modules, or a local
+# directory / UNC path. Overridden by RWH_UPDATE_SOURCES (separated by ";")
+# or update_sources.json next to the executable.
+DEFAULT_UPDATE_SOURCES = [LAN_SHARE, GITHUB_REPO]
+UPDATE_SOURCES_ENV = "RWH_UPDATE_SOURCES"
+UPDATE_SOURCES_FILE = "update_sources.json"
+# Ed25519 public key (hex) of the release tool's signing key; see
+# signing.py. versions.json must carry a valid signature from it before any
+# module or bundle it lists is installed. While unset, no update is installed.
+UPDATE_PUBLIC_KEY = ""
+PROBE_TIMEOUT = 1.5  # seconds to wait for any source to answer
+LOCAL_CACHE = os.path.join(os.path.dirname(sys.executable), "module_cache")
+VERSIONS_FILE = "versions.json"
+# Versions shipped inside the executable; anything in module_cache has to be
+# newer than these to be loaded.
+BUNDLED_VERSIONS = {
+    "parser.py": "1.0.0",
+    "template.py": "1.0.0",
+    "utils.py": "1.0.0"
+}
+# Functions core.py takes from each updatable module. utils.py comes first so
+# an updated template.py binds the updated process_element when it loads.
+MODULE_EXPORTS = {
+    "utils.py": ["replace_in_runs", "process_element", "build_output_filename"],
+    "parser.py": ["parse_txt_file", "build_hardware_profile"],
+    "template.py": ["fill_template"],
+}
+# Updatable modules that bind names from other updatable modules at import
+# time. When a dependency is loaded from module_cache the dependent is loaded
+# again too (from module_cache if newer, else the bundled copy), otherwise it
+# keeps calling the old functions.
+MODULE_DEPENDENCIES = {
+    "template.py": ["utils.py"],
+}
+MAX_DOWNLOAD_WORKERS = 4
+UPDATE_STATE_FILE = "update_state.json"
+MANIFEST_FILE = "manifest.json"
+BYTECODE_DIR = "__pycache__"
+# Manifest stored inside the update bundle that hashupdate.py builds.
+BUNDLE_MANIFEST = "manifest.json"
+UPDATE_TTL_ENV = "RWH_UPDATE_TTL"
+DEFAULT_UPDATE_TTL = 6 * 60 * 60  # seconds between network checks
+
+_session = None
+
+class GitHubSource:
+    # The contents API listing gives the download_url of versions.json and
+    # of every module.
+    def __init__(self, api_url):
+        self.name = api_url
+        self.api_url = api_url
+        self.listing = {}
+
+    def probe(self, timeout):
+        return probe_http(self.api_url, timeout)
+
+    def fetch_versions(self, session, state):
+        contents, _ = fetch_json(session, self.api_url, state)
+        logging.debug("API response: %s", contents)
+        # The repository has Template.py; versions.json and the cache use template.py.
+        self.listing = {item["name"].lower(): item["download_url"] for item in contents}
+        return fetch_json(session, self.listing[VERSIONS_FILE.lower()], state)
+
+    def open_file(self, session, file_name):
+        if file_name.lower() not in self.listing:
+            raise FileNotFoundError(f"{file_name} is not in the GitHub listing")
+        return open_url(session, self.listing[file_name.lower()])
+
+class HttpSource:
+    # Any web server (or python update_server.py) serving versions.json and
+    # the modules from one directory.
+    def __init__(self, base_url):
+        self.name = base_url
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+
+    def probe(self, timeout):
+        return probe_http(self.base_url, timeout)
+
+    def fetch_versions(self, session, state):
+        return fetch_json(session, urljoin(self.base_url, VERSIONS_FILE), state)
+
+    def open_file(self, session, file_name):
+        return open_url(session, urljoin(self.base_url, file_name))
+
+class DirectorySource:
+    # A local folder or SMB share, e.g. the one hashupdate.py publishes to.
+    def __init__(self, path):
+        self.name = path
+        self.path = path
+
+    def probe(self, timeout):
+        return os.path.isfile(os.path.join(self.path, VERSIONS_FILE))
+
+    def fetch_versions(self, session, state):
+        # Reading the file is as cheap as checking it, so there is no
+        # "not modified" shortcut here; the manifest comparison stays cheap.
+        with open(os.path.join(self.path, VERSIONS_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f), True
+
+    @contextlib.contextmanager
+    def open_file(self, session, file_name):
+        with open(os.path.join(self.path, file_name), 'rb') as f:
+            yield iter(lambda: f.read(65536), b"")
+
+def make_update_source(location):
+    if location.startswith("https://api.github.com/"):
+        return GitHubSource(location)
+    if location.startswith(("http://", "https://")):
+        return HttpSource(location)
+    return DirectorySource(location)
+
+def configured_update_sources():
+    locations = os.environ.get(UPDATE_SOURCES_ENV)
+    if locations:
+        locations = [location.strip() for location in locations.split(";") if location.strip()]
+    else:
+        config_path = os.path.join(os.path.dirname(sys.executable), UPDATE_SOURCES_FILE)
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                locations = json.load(f)
+        except FileNotFoundError:
+            locations = DEFAULT_UPDATE_SOURCES
+        except (OSError, ValueError) as e:
+            logging.warning("Ignoring unreadable %s: %s", config_path, e)
+            locations = DEFAULT_UPDATE_SOURCES
+    return [make_update_source(location) for location in locations]
+
+def probe_http(url, timeout):
+    # A bare TCP connect: tells us the host is reachable without spending a
+    # request (or GitHub rate limit) on it.
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    with socket.create_connection((parts.hostname, port), timeout=timeout):
+        return True
+
+def select_update_source(sources, timeout=PROBE_TIMEOUT):
+    # Probes every source at once and returns the most preferred one that
+    # answers within the timeout; it stops waiting as soon as every source
+    # ahead of the best reachable one has failed. The probes run on daemon
+    # threads: an unreachable UNC path can hang for far longer than the
+    # timeout, and its probe must not hold up app exit.
+    if len(sources) == 1:
+        return sources[0]
+    answers = queue.Queue()
+
+    def probe(index, source):
+        try:
+            answers.put((index, source.probe(timeout), None))
+        except Exception as e:
+            answers.put((index, False, e))
+
+    for index, source in enumerate(sources):
+        threading.Thread(target=probe, args=(index, source), name="source-probe", daemon=True).start()
+    reachable = [None] * len(sources)
+    deadline = time.monotonic() + timeout
+    while None in reachable:
+        try:
+            index, answered, error = answers.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            break
+        reachable[index] = bool(answered)
+        if error is not None:
+            if not isinstance(error, OSError):
+                raise error
+            logging.debug("Update source %s unreachable: %s", sources[index].name, error)
+        best = next((i for i, ok in enumerate(reachable) if ok), None)
+        if best is not None and all(ok is False for ok in reachable[:best]):
+            break
+    best = next((i for i, ok in enumerate(reachable) if ok), None)
+    if best is None:
+        return None
+    logging.info("Using update source %s", sources[best].name)
+    return sources[best]
+
+@contextlib.contextmanager
+def open_url(session, url):
+    with session.get(url, timeout=10, stream=True) as response:
+        response.raise_for_status()
+        yield response.iter_content(chunk_size=65536)
+
+def version_key(version):
+    # "1.0.10" must sort after "1.0.9", which plain string comparison gets wrong.
+    try:
+        return tuple(int(part) for part in version.split("."))
+    except (AttributeError, ValueError):
+        return (0,)
+
+def bundled_module_path(file_name):
+    # The copy shipped with the app: the bundle's assets folder when frozen,
+    # otherwise the source tree (where template.py is spelled Template.py).
+    if getattr(sys, 'frozen', False):
+        directory = os.path.join(sys._MEIPASS, 'assets')
+    else:
+        directory = os.path.dirname(os.path.abspath(__file__))
+    for entry in os.listdir(directory):
+        if entry.lower() == file_name:
+            return os.path.join(directory, entry)
+    return None
+
+def load_module(module_name, file_path):
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    if spec is None:
+        logging.error("Failed to create spec for %s", file_path)
+        return None
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def get_session():
+    # One keep-alive session for the listing, versions.json and every module download.
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=MAX_DOWNLOAD_WORKERS)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+def fetch_verified(source, session, file_name, expected_sha256):
+    # Streams the file into a temp file in LOCAL_CACHE while hashing it.
+    # Returns the temp path once the SHA-256 matches (the caller moves or
+    # removes it), or None after discarding a mismatched download.
+    fd, temp_path = tempfile.mkstemp(dir=LOCAL_CACHE, prefix=f"{file_name}.", suffix=".part")
+    try:
+        sha256 = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as f, source.open_file(session, file_name) as chunks:
+            for chunk in chunks:
+                sha256.update(chunk)
+                f.write(chunk)
+        if sha256.hexdigest() != expected_sha256:
+            logging.error("Checksum mismatch for %s. Discarding update.", file_name)
+            os.remove(temp_path)
+            return None
+        return temp_path
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def download_module(source, session, module_name, expected_sha256):
+    temp_path = fetch_verified(source, session, module_name, expected_sha256)
+    if temp_path is None:
+        return False
+    os.replace(temp_path, os.path.join(LOCAL_CACHE, module_name))
+    return True
+
+def install_bundle(source, session, bundle_info, outdated):
+    # One download for every outdated module. Each module is checked against
+    # both versions.json and the bundle's own manifest and staged next to the
+    # cache; nothing is replaced unless the whole set verified.
+    bundle_path = fetch_verified(source, session, bundle_info["file"], bundle_info.get("sha256", ""))
+    if bundle_path is None:
+        return False
+    staged = []
+    try:
+        with zipfile.ZipFile(bundle_path) as bundle:
+            bundled = json.loads(bundle.read(BUNDLE_MANIFEST)).get("modules", {})
+            for module_name, server_version, server_sha256 in outdated:
+                data = bundle.read(module_name)
+                if bundled.get(module_name, {}).get("sha256") != server_sha256 or hashlib.sha256(data).hexdigest() != server_sha256:
+                    logging.error("%s in %s does not match versions.json", module_name, bundle_info['file'])
+                    return False
+                fd, staged_path = tempfile.mkstemp(dir=LOCAL_CACHE, prefix=f"{module_name}.", suffix=".part")
+                staged.append((staged_path, module_name))
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+        for staged_path, module_name in staged:
+            os.replace(staged_path, os.path.join(LOCAL_CACHE, module_name))
+        staged = []
+        return True
+    except (zipfile.BadZipFile, KeyError, ValueError) as e:
+        logging.error("Unusable update bundle %s: %s", bundle_info['file'], e)
+        return False
+    finally:
+        os.remove(bundle_path)
+        for staged_path, _ in staged:
+            if os.path.exists(staged_path):
+                os.remove(staged_path)
+
+def load_json(name):
+    try:
+        with open(os.path.join(LOCAL_CACHE, name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning("Ignoring unreadable %s: %s", name, e)
+        return {}
+
+def save_json(name, content):
+    fd, temp_path = tempfile.mkstemp(dir=LOCAL_CACHE, prefix=f"{name}.", suffix=".part")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(content, f, indent=2)
+    os.replace(temp_path, os.path.join(LOCAL_CACHE, name))
+
+def load_update_state():
+    return load_json(UPDATE_STATE_FILE)
+
+def save_update_state(state):
+    save_json(UPDATE_STATE_FILE, state)
+
+def load_manifest():
+    # module name -> {"version", "sha256", "size", "mtime_ns"} for every
+    # module installed into module_cache by a verified download.
+    manifest = load_json(MANIFEST_FILE)
+    manifest.setdefault("modules", {})
+    return manifest
+
+def save_manifest(manifest):
+    save_json(MANIFEST_FILE, manifest)
+
+def installed_version(manifest, module_name):
+    entry = manifest["modules"].get(module_name)
+    bundled = BUNDLED_VERSIONS.get(module_name, "0.0.0")
+    if entry and version_key(entry["version"]) > version_key(bundled):
+        return entry["version"]
+    return bundled
+
+def record_installed(manifest, module_name, version, sha256):
+    stat = os.stat(os.path.join(LOCAL_CACHE, module_name))
+    manifest["modules"][module_name] = {"version": version, "sha256": sha256, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    count("modules_installed")
+
+def verify_cached_module(manifest, module_name):
+    # Trust the recorded hash while size and mtime are unchanged; only re-hash
+    # when the file has been touched since it was installed.
+    entry = manifest["modules"][module_name]
+    local_file = os.path.join(LOCAL_CACHE, module_name)
+    try:
+        stat = os.stat(local_file)
+    except FileNotFoundError:
+        return False
+    if stat.st_size == entry.get("size") and stat.st_mtime_ns == entry.get("mtime_ns"):
+        return True
+    if calculate_sha256(local_file) != entry["sha256"]:
+        return False
+    entry["size"], entry["mtime_ns"] = stat.st_size, stat.st_mtime_ns
+    return True
+
+def load_verified_module(module_name, file_path, sha256):
+    # Executes bytecode cached under the module's verified hash, compiling and
+    # caching it on first use, so an unchanged module is never recompiled.
+    bytecode_dir = os.path.join(LOCAL_CACHE, BYTECODE_DIR)
+    bytecode_path = os.path.join(bytecode_dir, f"{module_name}.{sha256[:16]}.pyc")
+    code = None
+    try:
+        with open(bytecode_path, 'rb') as f:
+            if f.read(len(importlib.util.MAGIC_NUMBER)) == importlib.util.MAGIC_NUMBER:
+                code = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        code = None
+    if code is None:
+        with open(file_path, 'rb') as f:
+            code = compile(f.read(), file_path, 'exec')
+        try:
+            os.makedirs(bytecode_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=bytecode_dir, suffix=".part")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(importlib.util.MAGIC_NUMBER)
+                marshal.dump(code, f)
+            os.replace(temp_path, bytecode_path)
+        except OSError as e:
+            logging.warning("Failed to cache bytecode for %s: %s", module_name, e)
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    exec(code, module.__dict__)
+    return module
+
+def update_check_ttl():
+    try:
+        return float(os.environ.get(UPDATE_TTL_ENV, DEFAULT_UPDATE_TTL))
+    except ValueError:
+        return DEFAULT_UPDATE_TTL
+
+def fetch_json(session, url, state):
+    # Conditional GET: send the stored ETag/Last-Modified and reuse the stored
+    # body on 304. Returns the body and whether it changed since the last check.
+    cached = state.setdefault("responses", {}).get(url)
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    response = session.get(url, headers=headers, timeout=10)
+    if response.status_code == 304 and cached:
+        logging.debug("%s not modified since the last check", url)
+        return cached["body"], False
+    response.raise_for_status()  # Raise an exception for bad status codes (e.g., 404)
+    body = response.json()
+    state["responses"][url] = {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified"), "body": body}
+    return body, True
+
+def check_for_updates(force=False):
+    # Runs on a background thread: downloads and loads updated modules, then
+    # returns the functions to swap in (name -> callable) for the UI thread to
+    # apply between generations. Errors propagate to the caller.
+    os.makedirs(LOCAL_CACHE, exist_ok=True)
+    state = load_update_state()
+    age = time.time() - state.get("last_check", 0)
+    manifest = load_manifest()
+    if not force and "source" in state and 0 <= age < update_check_ttl():
+        logging.info("Last update check was %.0fs ago; skipping the network", age)
+        with stage("update.load_modules"):
+            return load_cached_modules(manifest)
+
+    session = get_session()
+    with stage("update.select_source"):
+        source = select_update_source(configured_update_sources())
+    if source is None:
+        raise requests.exceptions.ConnectionError("No update source is reachable")
+    logging.debug("Checking updates from %s", source.name)
+    with stage("update.fetch_versions", source=source.name):
+        versions, versions_changed = source.fetch_versions(session, state)
+    server_versions = versions.get("modules", {})
+    logging.debug("Loaded versions: %s", server_versions)
+
+    # An unchanged versions.json (304) means everything it lists was already
+    # fetched by the last successful check, so there is nothing to compare.
+    candidates = server_versions if versions_changed else {}
+    complete = True
+    # Anyone who can serve versions.json can serve matching hashes, so only
+    # a signature from the release key makes its modules and bundle trusted.
+    if candidates and not verify_versions(versions, UPDATE_PUBLIC_KEY):
+        if UPDATE_PUBLIC_KEY:
+            logging.error("versions.json from %s is not signed by the release key; ignoring its updates", source.name)
+        else:
+            logging.error("UPDATE_PUBLIC_KEY is not set; ignoring updates from %s", source.name)
+        candidates = {}
+        complete = False
+    outdated = []
+    for module_name in MODULE_EXPORTS:
+        if module_name not in candidates:
+            continue
+        server_info = server_versions[module_name]
+        server_version = server_info.get("version", "0.0.0")
+        current_version = installed_version(manifest, module_name)
+        logging.debug("Checking %s: Current=%s, Server=%s", module_name, current_version, server_version)
+        if version_key(server_version) > version_key(current_version):
+            logging.info("Update available for %s: %s -> %s", module_name, current_version, server_version)
+            outdated.append((module_name, server_version, server_info.get("sha256", "")))
+
+    with stage("update.install"):
+        bundle_info = versions.get("bundle")
+        if outdated and bundle_info:
+            try:
+                installed = install_bundle(source, session, bundle_info, outdated)
+            except OSError as e:
+                logging.error("Failed to download %s: %s", bundle_info.get('file'), e)
+                installed = False
+            if installed:
+                count("bytes_downloaded", bundle_info.get("size", 0))
+                for module_name, server_version, server_sha256 in outdated:
+                    record_installed(manifest, module_name, server_version, server_sha256)
+                    logging.info("Installed %s v%s from %s", module_name, server_version, bundle_info['file'])
+                save_manifest(manifest)
+                outdated = []
+            else:
+                logging.warning("Falling back to per-module downloads")
+
+        if outdated:
+            with ThreadPoolExecutor(max_workers=min(len(outdated), MAX_DOWNLOAD_WORKERS), thread_name_prefix="module-download") as executor:
+                futures = {executor.submit(download_module, source, session, module_name, sha256): (module_name, version, sha256)
+                           for module_name, version, sha256 in outdated}
+                for future in as_completed(futures):
+                    module_name, server_version, server_sha256 = futures[future]
+                    try:
+                        downloaded = future.result()
+                    except OSError as e:
+                        # requests' exceptions are OSErrors too, so this covers both kinds of source.
+                        logging.error("Failed to download %s: %s", module_name, e)
+                        complete = False
+                        continue
+                    if downloaded:
+                        count("bytes_downloaded", os.path.getsize(os.path.join(LOCAL_CACHE, module_name)))
+                        record_installed(manifest, module_name, server_version, server_sha256)
+                        logging.info("Successfully downloaded %s v%s", module_name, server_version)
+                    else:
+                        complete = False
+            save_manifest(manifest)
+
+    # Only remember this check when every download landed, so a failed
+    # module is retried next launch instead of being hidden behind a 304.
+    if complete:
+        state["source"] = source.name
+        state["last_check"] = time.time()
+        save_update_state(state)
+    with stage("update.load_modules"):
+        return load_cached_modules(manifest)
+
+def load_cached_modules(manifest):
+    # Only modules newer than the bundled copy are loaded, plus any module
+    # whose dependency was (see MODULE_DEPENDENCIES); anything else in
+    # module_cache would just re-execute what is already running.
+    updates = {}
+    loaded = set()
+    manifest_changed = False
+    for module_name, exports in MODULE_EXPORTS.items():
+        entry = manifest["modules"].get(module_name)
+        module = None
+        if entry and version_key(entry["version"]) > version_key(BUNDLED_VERSIONS.get(module_name, "0.0.0")):
+            recorded = (entry.get("size"), entry.get("mtime_ns"))
+            if verify_cached_module(manifest, module_name):
+                manifest_changed |= recorded != (entry["size"], entry["mtime_ns"])
+                module = load_verified_module(module_name.replace('.py', ''), os.path.join(LOCAL_CACHE, module_name), entry["sha256"])
+                if module:
+                    logging.info("Loaded updated module %s v%s", module_name, entry['version'])
+            else:
+                logging.error("Cached %s does not match its recorded hash; ignoring it", module_name)
+                del manifest["modules"][module_name]
+                manifest_changed = True
+                # Forget the conditional-request state so the next check re-downloads it.
+                save_update_state({})
+        if module is None and loaded.intersection(MODULE_DEPENDENCIES.get(module_name, [])):
+            bundled_path = bundled_module_path(module_name)
+            if bundled_path:
+                module = load_module(module_name.replace('.py', ''), bundled_path)
+                logging.info("Reloaded bundled %s against the updated %s", module_name,
+                             ", ".join(sorted(loaded.intersection(MODULE_DEPENDENCIES[module_name]))))
+            else:
+                logging.error("Bundled %s not found; it keeps using the old %s", module_name, ", ".join(MODULE_DEPENDENCIES[module_name]))
+        if module:
+            loaded.add(module_name)
+            for name in exports:
+                if hasattr(module, name):
+                    updates[name] = getattr(module, name)
+                else:
+                    logging.warning("Updated module %s has no %s; keeping the current one", module_name, name)
+    if manifest_changed:
+        save_manifest(manifest)
+    return updates
@@ -1,33 +1,82 @@
 # utils.py
+import os
+import re
 import logging
+from datetime import datetime
 from docx.shared import Pt
+from instrumentation import count
 
-def replace_in_runs(runs, placeholder, replacement):
-    full_text = "".join(run.text for run in runs)
-    if placeholder not in full_text:
-        return False
+_placeholder_patterns = {}
+
+def placeholder_pattern(placeholders):
+    key = tuple(placeholders)
+    pattern = _placeholder_patterns.get(key)
+    if pattern is None:
+        # Longest first so a placeholder that prefixes another never wins the alternation.
+        pattern = re.compile("|".join(re.escape(placeholder) for placeholder in sorted(key, key=len, reverse=True)))
+        _placeholder_patterns[key] = pattern
+    return pattern
+
+def substitute_runs(runs, pattern, replacements):
+    # Scans the joined run text once and rewrites only the runs a match
+    # touches. Each replacement value lands in the run where its placeholder
+    # starts; the rest of a placeholder split across runs is removed from the
+    # following runs, so every run keeps its own formatting.
+    texts = [run.text for run in runs]
+    full_text = "".join(texts)
+    matches = list(pattern.finditer(full_text))
+    if not matches:
+        return 0
 
-    logging.debug(f"Found placeholder {placeholder} in runs")
-    new_text = full_text.replace(placeholder, replacement)
+    match_index = 0
+    offset = 0
+    rewritten = 0
+    for run, text in zip(runs, texts):
+        run_start, run_end = offset, offset + len(text)
+        offset = run_end
+        pieces = []
+        received_value = False
+        position = run_start
+        while position < run_end:
+            while match_index < len(matches) and matches[match_index].end() <= position:
+                match_index += 1
+            if match_index == len(matches) or matches[match_index].start() >= run_end:
+                pieces.append(full_text[position:run_end])
+                break
+            match = matches[match_index]
+            if match.start() > position:
+                pieces.append(full_text[position:match.start()])
+                position = match.start()
+            if position == match.start():
+                pieces.append(replacements[match.group()])
+                received_value = True
+            position = min(match.end(), run_end)
 
-    for run in runs:
-        run.text = ""
+        new_text = "".join(pieces)
+        if new_text != text:
+            run.text = new_text
+            rewritten += 1
+        if received_value:
+            run.font.name = 'Calibri'
+            run.font.size = Pt(11)
 
-    runs[0].text = new_text
-    return True
+    count("runs_rewritten", rewritten)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        for match in matches:
+            logging.debug("Replaced %s with %s", match.group(), replacements[match.group()])
+    return len(matches)
+
+def replace_in_runs(runs, placeholder, replacement):
+    return substitute_runs(runs, placeholder_pattern((placeholder,)), {placeholder: replacement}) > 0
 
 def process_element(element, replacements):
-    for placeholder, value in replacements.items():
-        replaced = False
-        if placeholder in element.text:
-            element.text = element.text.replace(placeholder, value)
-            for run in element.runs:
-                run.font.name = 'Calibri'
-                run.font.size = Pt(11)
-            replaced = True
-            logging.debug(f"Replaced {placeholder} in paragraph text")
-        else:
-            replaced = replace_in_runs(element.runs, placeholder, value)
-
-        if replaced:
-            logging.debug(f"Successfully replaced {placeholder} with {value}")
\ No newline at end of file
+    count("paragraphs_visited")
+    if not replacements:
+        return 0
+    return substitute_runs(element.runs, placeholder_pattern(replacements), replacements)
+
+def build_output_filename(output_dir, profile):
+    brand_name = (profile.brand_name or 'Unknown').replace(" ", "_")
+    serial_number = profile.serial_number or 'Unknown'
+    current_date = datetime.now().strftime("%m/%d/%Y").replace("/", "")
+    return os.path.join(output_dir, f"{brand_name}_{serial_number}_{current_date}.docx")
\ No newline at end of file